@@ -0,0 +1,39 @@
+"""
+Compares the old fixed 30 s OR-Tools budget with the adaptive budget and
+plateau stopping of solve_open_tsp on a set of random instances, reporting
+solve latency and route length for each.
+
+Usage: python benchmarks/bench_adaptive_budget.py [fixed_seconds]
+"""
+import os
+import sys
+import statistics
+from bench_transit_evaluators import random_instance
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from optimizer import solve_open_tsp
+
+BENCHMARK_SIZES = (20, 40, 80, 120, 200)
+SEEDS = (0, 1)
+
+
+if __name__ == "__main__":
+    fixed_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+    print(f"{'N':>5} {'seed':>4} {'fixed s':>8} {'fixed km':>9} {'adaptive s':>10} {'adaptive km':>11} {'stop_reason':>12}")
+    fixed_times, adaptive_times, ratios = [], [], []
+    for n in BENCHMARK_SIZES:
+        for seed in SEEDS:
+            distance, time = random_instance(n, seed)
+            names = [str(i) for i in range(n)]
+            fixed = solve_open_tsp(distance, time, names, engine="ortools",
+                                   time_limit_seconds=fixed_seconds, plateau_seconds=float("inf"))
+            adaptive = solve_open_tsp(distance, time, names, engine="ortools")
+            fixed_times.append(fixed["solve_seconds"])
+            adaptive_times.append(adaptive["solve_seconds"])
+            ratios.append(adaptive["total_distance_km"] / fixed["total_distance_km"])
+            print(f"{n:>5} {seed:>4} {fixed['solve_seconds']:>8.2f} {fixed['total_distance_km']:>9.2f} "
+                  f"{adaptive['solve_seconds']:>10.2f} {adaptive['total_distance_km']:>11.2f} {adaptive['stop_reason']:>12}")
+
+    print(f"median solve time: fixed {statistics.median(fixed_times):.2f} s, adaptive {statistics.median(adaptive_times):.2f} s")
+    print(f"route length adaptive/fixed: mean {statistics.mean(ratios):.4f}, worst {max(ratios):.4f}")
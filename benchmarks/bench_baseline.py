@@ -0,0 +1,49 @@
+"""
+Times routing.random_route_baseline (BASELINE_SAMPLES seeded random orders
+priced in one gather) against the same number of calculate_random_route calls,
+and shows how much the reported "non-optimized" distance moves between clicks:
+one shuffle per click versus the baseline median under different seeds.
+
+Usage: python benchmarks/bench_baseline.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from routing import random_route_baseline, calculate_random_route, BASELINE_SAMPLES
+
+SIZES = (10, 25, 50, 100, 500)
+CLICKS = 50
+
+
+def random_matrices(n, seed=0):
+    points = np.random.default_rng(seed).random((n, 2)) * 20000
+    distance = np.hypot(*(points[:, None] - points[None]).transpose(2, 0, 1))
+    return distance, distance / 5.5
+
+
+if __name__ == "__main__":
+    print(f"{BASELINE_SAMPLES} samples per baseline")
+    print(f"{'N':>5} {'baseline ms':>11} {'loop ms':>8} {'shuffle spread km':>17} {'median spread km':>16}")
+    for n in SIZES:
+        names = [str(i) for i in range(n)]
+        distance, duration = random_matrices(n)
+
+        started = time.perf_counter()
+        random_route_baseline(names, distance, duration, 0)
+        baseline_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        for _ in range(BASELINE_SAMPLES):
+            calculate_random_route(names, distance, duration, 0)
+        loop_ms = (time.perf_counter() - started) * 1000
+
+        # Standard deviation of the reported distance over repeated clicks
+        shuffles = [calculate_random_route(names, distance, duration, 0)["total_distance_km"] for _ in range(CLICKS)]
+        medians = [random_route_baseline(names, distance, duration, 0, seed=seed)["total_distance_km"]
+                   for seed in range(CLICKS)]
+        print(f"{n:>5} {baseline_ms:>11.1f} {loop_ms:>8.0f} {np.std(shuffles):>17.2f} {np.std(medians):>16.2f}",
+              flush=True)
@@ -0,0 +1,44 @@
+"""
+Compares solve_decomposed (cluster-and-stitch) with one monolithic OR-Tools
+solve on random city-sized instances, reporting wall time and route length.
+
+Usage: python benchmarks/bench_decomposition.py [max_monolithic_n]
+Monolithic solves are skipped above max_monolithic_n (default 2000).
+"""
+import os
+import sys
+import time
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from optimizer import solve_decomposed, solve_open_tsp
+
+SIZES = (500, 1000, 2000, 5000)
+
+
+def city_instance(n, seed=0):
+    # Random stops in a ~45 km square around Bangalore, road distance ~1.3x straight line
+    rng = np.random.default_rng(seed)
+    coordinates = np.column_stack([12.8 + rng.random(n) * 0.4, 77.4 + rng.random(n) * 0.4])
+    metres = np.column_stack([coordinates[:, 1] * 111000 * np.cos(np.radians(13.0)), coordinates[:, 0] * 111000])
+    distance = np.linalg.norm(metres[:, None] - metres[None], axis=2) * 1.3
+    return coordinates, distance, distance / 8.0
+
+
+if __name__ == "__main__":
+    max_monolithic = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'N':>5} {'mono s':>7} {'mono km':>9} {'decomp s':>9} {'decomp km':>10} {'clusters':>8}")
+    for n in SIZES:
+        coordinates, distance, duration = city_instance(n)
+        names = [str(i) for i in range(n)]
+        mono_s, mono_km = float("nan"), float("nan")
+        if n <= max_monolithic:
+            started = time.perf_counter()
+            mono = solve_open_tsp(distance, duration, names, 0, engine="ortools")
+            mono_s, mono_km = time.perf_counter() - started, mono["total_distance_km"]
+        started = time.perf_counter()
+        decomposed = solve_decomposed(distance, duration, names, coordinates, 0)
+        decomp_s = time.perf_counter() - started
+        print(f"{n:>5} {mono_s:>7.1f} {mono_km:>9.1f} {decomp_s:>9.1f} "
+              f"{decomposed['total_distance_km']:>10.1f} {decomposed['clusters']:>8}", flush=True)
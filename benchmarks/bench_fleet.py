@@ -0,0 +1,51 @@
+"""
+Compares one multi-vehicle solve_fleet call with the manual workflow of
+splitting stops between trucks (equal angular sectors around the depot) and
+running solve_open_tsp once per truck. Reports total solver-seconds and
+total fleet distance.
+
+Usage: python benchmarks/bench_fleet.py
+"""
+import os
+import sys
+import math
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from optimizer import solve_fleet, solve_open_tsp
+
+CASES = ((60, 3), (120, 4), (200, 6))
+
+
+def instance(n, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.random((n, 2)) * 20000
+    points[0] = (10000, 10000)  # depot in the middle
+    distance = np.linalg.norm(points[:, None] - points[None], axis=2)
+    return points, distance, distance / 8.0
+
+
+def sequential(points, distance, time, trucks):
+    angles = np.arctan2(points[1:, 1] - points[0, 1], points[1:, 0] - points[0, 0])
+    order = np.argsort(angles) + 1
+    seconds, km = 0.0, 0.0
+    for sector in np.array_split(order, trucks):
+        idx = [0] + sector.tolist()
+        result = solve_open_tsp(distance[np.ix_(idx, idx)], time[np.ix_(idx, idx)],
+                                [str(i) for i in idx], 0, engine="ortools")
+        seconds += result["solve_seconds"]
+        km += result["total_distance_km"]
+    return seconds, km
+
+
+if __name__ == "__main__":
+    print(f"{'N':>5} {'trucks':>6} {'per-truck s':>11} {'per-truck km':>12} {'fleet s':>8} {'fleet km':>9}")
+    for n, trucks in CASES:
+        points, distance, time = instance(n)
+        seq_seconds, seq_km = sequential(points, distance, time, trucks)
+        capacity = math.ceil((n - 1) / trucks)
+        fleet = solve_fleet(distance, time, [str(i) for i in range(n)], trucks,
+                            vehicle_capacities=[capacity] * trucks)
+        print(f"{n:>5} {trucks:>6} {seq_seconds:>11.2f} {seq_km:>12.2f} "
+              f"{fleet['solve_seconds']:>8.2f} {fleet['total_distance_km']:>9.2f}")
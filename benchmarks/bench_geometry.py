@@ -0,0 +1,89 @@
+"""
+Measures map payload and build time of routing.plot_routes_from_names at full
+resolution versus Douglas-Peucker simplification (geometry.simplify_for_zoom)
+and the alternatives options, on synthetic road-like legs (straight runs with
+turns, one vertex every ~10 m, three routes per leg), next to the compact
+JSON/GeoJSON of routing.route_geometry for the same route. Also compares the
+vectorized polyline decoder with the pure-Python polyline package.
+
+Usage: python benchmarks/bench_geometry.py [stops]
+"""
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+import polyline
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+import routing
+from geometry import decode_polyline
+
+ROUTES_PER_LEG = 3
+VERTEX_SPACING_DEG = 0.0001  # ~10 m
+
+
+def road_like_path(origin, destination, rng):
+    # Manhattan-style detour through a few random corners, densely sampled
+    corners = [np.asarray(origin)]
+    for _ in range(rng.integers(3, 8)):
+        target = corners[-1] + (np.asarray(destination) - corners[-1]) * rng.uniform(0.2, 0.6)
+        corners.append(np.array([target[0], corners[-1][1]]))
+        corners.append(target)
+    corners.append(np.asarray(destination))
+    pieces = []
+    for a, b in zip(corners, corners[1:]):
+        steps = max(2, int(np.abs(b - a).max() / VERTEX_SPACING_DEG))
+        pieces.append(a + np.linspace(0, 1, steps)[:, None] * (b - a))
+    path = np.concatenate(pieces) + rng.normal(0, 2e-6, (sum(len(p) for p in pieces), 2))
+    return np.round(path, 5)
+
+
+def fake_leg_routes(origin, destination, api_key, alternatives=True):
+    rng = np.random.default_rng(abs(hash((origin, destination))) % 2 ** 32)
+    routes = []
+    for _ in range(ROUTES_PER_LEG if alternatives else 1):
+        path = road_like_path(origin, destination, rng)
+        encoded = polyline.encode([tuple(p) for p in path])
+        routes.append({"coords": decode_polyline(encoded), "polyline": encoded,
+                       "distance_km": len(path) * 0.01, "duration_min": len(path) * 0.02})
+    return routes
+
+
+if __name__ == "__main__":
+    stops = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"Name": [str(i) for i in range(stops)],
+                       "Latitude": 12.85 + rng.random(stops) * 0.3, "Longitude": 77.45 + rng.random(stops) * 0.3})
+    routing.get_leg_routes = fake_leg_routes
+
+    encoded = fake_leg_routes((12.9, 77.5), (13.1, 77.7), None)[0]["polyline"]
+    started = time.perf_counter()
+    polyline.decode(encoded)
+    python_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    decode_polyline(encoded)
+    numpy_ms = (time.perf_counter() - started) * 1000
+    print(f"decode {len(encoded)} chars: polyline package {python_ms:.2f} ms, vectorized {numpy_ms:.2f} ms")
+
+    print(f"{'mode':>24} {'points':>7} {'html KB':>8} {'build s':>8}")
+    for label, zoom, alternatives in (("full resolution", 0, "all"), ("zoom 16", 16, "all"),
+                                      ("zoom 14", 14, "all"), ("zoom 16, thin", 16, "thin"),
+                                      ("zoom 16, none", 16, "none")):
+        names = [str(i) for i in range(stops)]
+        started = time.perf_counter()
+        html = routing.plot_routes_from_names(names, df, None, simplify_zoom=zoom, alternatives=alternatives)._repr_html_()
+        elapsed = time.perf_counter() - started
+        legs = routing.fetch_route_legs([tuple(c) for c in df[["Latitude", "Longitude"]].to_numpy().tolist()], None,
+                                        alternatives != "none")
+        points = sum(len(coords) for drawn in routing.select_map_geometry(legs, zoom, alternatives).values()
+                     for _, coords in drawn)
+        print(f"{label:>24} {points:>7} {len(html) / 1024:>8.0f} {elapsed:>8.2f}", flush=True)
+
+    names = [str(i) for i in range(stops)]
+    for output in ("json", "geojson"):
+        started = time.perf_counter()
+        body = json.dumps(routing.route_geometry(names, df, None, output=output))
+        print(f"{'route_geometry ' + output:>24} {'':>7} {len(body) / 1024:>8.0f} {time.perf_counter() - started:>8.2f}")
@@ -0,0 +1,35 @@
+"""
+Compares the in-process NumPy local search (numpy_solver.solve_local_search)
+with the OR-Tools engine of solve_open_tsp on random instances, reporting
+solve time and route length. Used to pick IN_PROCESS_MAX_STOPS.
+
+Usage: python benchmarks/bench_local_search.py
+"""
+import os
+import sys
+import statistics
+from bench_transit_evaluators import random_instance
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from numpy_solver import solve_local_search
+from optimizer import solve_open_tsp
+
+BENCHMARK_SIZES = (20, 30, 40, 60, 80, 120)
+SEEDS = (0, 1, 2)
+
+
+if __name__ == "__main__":
+    print(f"{'N':>5} {'ortools s':>9} {'local s':>8} {'worst ratio':>11} {'mean ratio':>10}")
+    for n in BENCHMARK_SIZES:
+        ortools_times, local_times, ratios = [], [], []
+        for seed in SEEDS:
+            distance, time = random_instance(n, seed)
+            names = [str(i) for i in range(n)]
+            reference = solve_open_tsp(distance, time, names, engine="ortools")
+            local = solve_local_search(distance, time, names)
+            ortools_times.append(reference["solve_seconds"])
+            local_times.append(local["solve_seconds"])
+            ratios.append(local["total_distance_km"] / reference["total_distance_km"])
+        print(f"{n:>5} {statistics.mean(ortools_times):>9.2f} {statistics.mean(local_times):>8.3f} "
+              f"{max(ratios):>11.4f} {statistics.mean(ratios):>10.4f}", flush=True)
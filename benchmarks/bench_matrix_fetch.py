@@ -0,0 +1,91 @@
+"""
+Fetches full N x N matrices through routing.get_distance_and_duration_matrices
+from a local stub of the Distance Matrix API that answers after a fixed
+latency and fails a share of requests with HTTP 500, comparing one request in
+flight with MATRIX_FETCH_WORKERS. The travel-time cache and rate limit are off
+so every tile really goes over the wire.
+
+Usage: python benchmarks/bench_matrix_fetch.py [latency_seconds] [failure_rate]
+"""
+import os
+import sys
+import json
+import time
+import random
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+
+os.environ["TRAVEL_CACHE"] = "0"
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+import routing
+
+SIZES = (25, 50, 100)
+WORKER_COUNTS = (1, routing.MATRIX_FETCH_WORKERS)
+
+
+def make_handler(latency_seconds, failure_rate):
+    class StubDistanceMatrix(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency_seconds)
+            if random.random() < failure_rate:
+                self.send_response(500)
+                self.end_headers()
+                return
+            query = parse_qs(urlparse(self.path).query)
+            origins = [tuple(map(float, c.split(","))) for c in query["origins"][0].split("|")]
+            destinations = [tuple(map(float, c.split(","))) for c in query["destinations"][0].split("|")]
+            if len(origins) * len(destinations) > routing.MAX_MATRIX_ELEMENTS:
+                body = {"status": "MAX_ELEMENTS_EXCEEDED", "rows": []}
+            else:
+                rows = [{"elements": [{"status": "OK",
+                                       "distance": {"value": round(111000 * np.hypot(o[0] - d[0], o[1] - d[1]))},
+                                       "duration": {"value": round(10000 * np.hypot(o[0] - d[0], o[1] - d[1]))}}
+                                      for d in destinations]} for o in origins]
+                body = {"status": "OK", "rows": rows}
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return StubDistanceMatrix
+
+
+if __name__ == "__main__":
+    latency_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+    failure_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency_seconds, failure_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    routing.DISTANCE_MATRIX_URL = f"http://127.0.0.1:{server.server_address[1]}/maps/api/distancematrix/json"
+    routing.MATRIX_BACKOFF_SECONDS = 0.05
+    routing._matrix_rate_limiter.rate = 0
+
+    rng = np.random.default_rng(0)
+    points = 12.9 + rng.random((max(SIZES), 2)) * 0.2
+    df = pd.DataFrame({"Name": [str(i) for i in range(len(points))],
+                       "Latitude": points[:, 0], "Longitude": points[:, 1]})
+
+    print(f"stub latency {latency_seconds * 1000:.0f} ms, failure rate {failure_rate:.0%}")
+    print(f"{'N':>5} {'tiles':>6} {'workers':>7} {'seconds':>8}")
+    for n in SIZES:
+        names = [str(i) for i in range(n)]
+        reference = None
+        for workers in WORKER_COUNTS:
+            routing.MATRIX_FETCH_WORKERS = workers
+            started = time.perf_counter()
+            distance, duration = routing.get_distance_and_duration_matrices(names, df, "stub-key")
+            elapsed = time.perf_counter() - started
+            if reference is None:
+                reference = distance
+            assert np.array_equal(distance, reference)
+            tiles = len(routing._tile(names, names))
+            print(f"{n:>5} {tiles:>6} {workers:>7} {elapsed:>8.2f}", flush=True)
+    server.shutdown()
@@ -0,0 +1,48 @@
+"""
+Measures the cost of handing the distance and time matrices to optimizer.py:
+JSON lists (tolist + dumps in the backend, loads + np.array in the optimizer)
+versus the memory-mapped .npy file written by matrix_transport.matrix_payload.
+
+Usage: python benchmarks/bench_matrix_transport.py
+"""
+import os
+import sys
+import json
+import time
+from bench_transit_evaluators import random_instance
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+import matrix_transport
+from matrix_transport import matrix_payload, load_matrices
+
+SIZES = (100, 500, 1000, 2000)
+
+
+def json_round_trip(distance, time_matrix, names):
+    started = time.perf_counter()
+    text = json.dumps({"distance_matrix": distance.tolist(), "time_matrix": time_matrix.tolist(),
+                       "location_names": names})
+    load_matrices(json.loads(text))
+    return time.perf_counter() - started, len(text)
+
+
+def binary_round_trip(distance, time_matrix, names):
+    started = time.perf_counter()
+    with matrix_payload({"location_names": names}, distance, time_matrix) as payload:
+        text = json.dumps(payload)
+        received_distance, received_time = load_matrices(json.loads(text))
+        # Touch every page so the comparison includes actually reading the data
+        received_distance.sum(), received_time.sum()
+    return time.perf_counter() - started, len(text)
+
+
+if __name__ == "__main__":
+    matrix_transport.BINARY_MIN_STOPS = 0
+    print(f"{'N':>5} {'json s':>8} {'json MB':>8} {'binary s':>9} {'binary MB':>9}")
+    for n in SIZES:
+        distance, time_matrix = random_instance(n)
+        names = [f"Store {i}" for i in range(n)]
+        json_s, json_bytes = json_round_trip(distance, time_matrix, names)
+        binary_s, binary_bytes = binary_round_trip(distance, time_matrix, names)
+        print(f"{n:>5} {json_s:>8.3f} {json_bytes / 1e6:>8.1f} {binary_s:>9.3f} {binary_bytes / 1e6:>9.3f}")
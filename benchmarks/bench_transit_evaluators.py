@@ -0,0 +1,75 @@
+"""
+Compares how many solutions guided local search explores per second when arc
+costs come from Python callbacks (the old solve_open_tsp) versus integer
+matrices registered with RegisterTransitMatrix (the current one).
+
+Usage: python benchmarks/bench_transit_evaluators.py [seconds_per_run]
+"""
+import os
+import sys
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from optimizer import _to_int_matrix
+
+
+def random_instance(n, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.random((n, 2)) * 20000  # metres, roughly a city
+    distance = np.linalg.norm(points[:, None] - points[None], axis=2)
+    time = distance / 8.0  # ~30 km/h
+    return distance, time
+
+
+def extend(matrix):
+    n = len(matrix)
+    extended = np.full((n + 1, n + 1), 1e9)
+    extended[:n, :n] = matrix
+    extended[:, -1] = 0
+    extended[-1, :] = 0
+    return extended
+
+
+def solutions_per_second(distance, time, native, seconds):
+    ext_distance, ext_time = extend(distance), extend(time)
+    size = len(ext_distance)
+    manager = pywrapcp.RoutingIndexManager(size, 1, [0], [size - 1])
+    routing = pywrapcp.RoutingModel(manager)
+
+    if native:
+        distance_index = routing.RegisterTransitMatrix(_to_int_matrix(ext_distance).tolist())
+        time_index = routing.RegisterTransitMatrix(_to_int_matrix(ext_time).tolist())
+    else:
+        def distance_callback(from_index, to_index):
+            return int(ext_distance[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)])
+
+        def time_callback(from_index, to_index):
+            return int(ext_time[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)])
+
+        distance_index = routing.RegisterTransitCallback(distance_callback)
+        time_index = routing.RegisterTransitCallback(time_callback)
+
+    routing.SetArcCostEvaluatorOfAllVehicles(distance_index)
+    routing.AddDimension(time_index, 0, int(_to_int_matrix(ext_time).max()) * size, True, "Time")
+
+    solutions = [0]
+    routing.AddAtSolutionCallback(lambda: solutions.__setitem__(0, solutions[0] + 1))
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    params.time_limit.seconds = seconds
+    assignment = routing.SolveWithParameters(params)
+    return solutions[0] / seconds, assignment.ObjectiveValue() / 1000
+
+
+if __name__ == "__main__":
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'N':>5} {'callback sol/s':>15} {'matrix sol/s':>13} {'speedup':>8} {'callback km':>12} {'matrix km':>10}")
+    for n in (10, 25, 50, 100, 200):
+        distance, time = random_instance(n)
+        slow, slow_km = solutions_per_second(distance, time, native=False, seconds=seconds)
+        fast, fast_km = solutions_per_second(distance, time, native=True, seconds=seconds)
+        print(f"{n:>5} {slow:>15.0f} {fast:>13.0f} {fast / max(slow, 1e-9):>7.1f}x {slow_km:>12.1f} {fast_km:>10.1f}")
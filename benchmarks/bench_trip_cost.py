@@ -0,0 +1,35 @@
+"""
+Prices a finance-style scenario grid (trips x truck types x fuel prices x toll
+scenarios) with routing.calculate_trip_costs in one broadcast, and with a
+Python loop over routing.calculate_trip_cost for comparison.
+
+Usage: python benchmarks/bench_trip_cost.py [trips]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from routing import calculate_trip_cost, calculate_trip_costs, TRUCK_SPECS
+
+FUEL_PRICES = (82.0, 87.0, 92.0, 97.0, 102.0)
+TOLLS = (0.0, 150.0, 300.0, 600.0)
+
+if __name__ == "__main__":
+    trips = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    distances = np.random.default_rng(0).uniform(5, 400, trips)
+
+    started = time.perf_counter()
+    table = calculate_trip_costs(distances, tuple(TRUCK_SPECS), FUEL_PRICES, TOLLS)
+    batch_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = [calculate_trip_cost(float(d), truck, price, toll)
+            for d in distances for truck in TRUCK_SPECS for price in FUEL_PRICES for toll in TOLLS]
+    loop_s = time.perf_counter() - started
+
+    assert np.array_equal(table["total_trip_cost"].to_numpy(), [row["total_trip_cost"] for row in rows])
+    print(f"{len(table)} priced trips: batch {batch_s * 1000:.0f} ms, scalar loop {loop_s * 1000:.0f} ms "
+          f"({loop_s / batch_s:.0f}x)")
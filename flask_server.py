@@ -1,10 +1,40 @@
-from flask import Flask, request, jsonify
-import subprocess
+from flask import Flask, request, jsonify, Response
 import json
 import sys
 import os
+from dotenv import load_dotenv
+from worker_pool import get_pool, WorkerError
+from jobs import JobManager, sse_format
+from route_backend_backend import LOCATIONS_PATH, SOLVER_PARAMS, DUMMY_MAP_HTML, optimize_batch, handle_route_request
+from result_cache import cache_from_env, cache_key, location_table_version
+from routing import MAP_ALTERNATIVE_MODES
+from locations import load_location_registry
+import metrics
 
 app = Flask(__name__)
+_api_key = None
+_job_manager = None
+map_cache = cache_from_env()
+
+
+def get_api_key():
+    global _api_key
+    if _api_key is None:
+        load_dotenv()
+        _api_key = os.getenv('API_KEY')
+    return _api_key
+
+
+def get_locations():
+    """Location registry (from the shared workbook snapshot) and API key for endpoints that run in this process."""
+    return load_location_registry(LOCATIONS_PATH), get_api_key()
+
+
+def get_job_manager():
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(lambda: load_location_registry(LOCATIONS_PATH), get_api_key())
+    return _job_manager
 
 @app.route('/api/get-map-html', methods=['POST'])
 def get_map_html():
@@ -13,21 +43,134 @@ def get_map_html():
     route = data.get('route', [])
     # Add more params as needed
 
-    # Prepare input for the Python backend file
-    input_payload = {
-        'route': route  }
-    # Run the backend Python file (adjust path as needed)
-    process = subprocess.Popen(
-        [sys.executable, 'route_backend_backend.py'],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    stdout, stderr = process.communicate(input=json.dumps(input_payload))
-    if process.returncode != 0:
-        return jsonify({'html': f"<div style='color:red'>Python error: {stderr}</div>"}), 500
-    return jsonify({'html': stdout})
+    # Identical stops against the same location table always give the same map
+    key = cache_key(route, 0, SOLVER_PARAMS, location_table_version(LOCATIONS_PATH), kind="map_html")
+    if request.if_none_match.contains(key):
+        metrics.inc("route_cache_hits_total", cache="map_html_etag")
+        response = Response(status=304)
+        response.set_etag(key)
+        return response
+
+    html = map_cache.get(key)
+    if html is not None:
+        metrics.inc("route_cache_hits_total", cache="map_html")
+    else:
+        metrics.inc("route_cache_misses_total", cache="map_html")
+        # Prepare input for the Python backend
+        input_payload = {
+            'route': route  }
+        # Run the request on a warm worker (see worker_pool.py)
+        try:
+            result = get_pool().submit(input_payload)
+        except WorkerError as e:
+            return jsonify({'html': f"<div style='color:red'>Python error: {e}</div>"}), 500
+        html = result['html']
+        if html == DUMMY_MAP_HTML or result['matrix_estimated']:
+            # Pipeline failed, or planned on offline estimates during an API
+            # outage; don't cache or tag either, so the next request retries
+            return jsonify(result)
+        map_cache.set(key, html)
+
+    response = jsonify({'html': html})
+    response.set_etag(key)
+    return response
+
+@app.route('/api/get-route', methods=['POST'])
+def get_route():
+    """
+    Compact alternative to /api/get-map-html for clients that draw the map
+    themselves: the optimized stops, leg metrics and simplified geometry as
+    JSON ('format': 'json', lines as encoded polylines) or GeoJSON
+    ('format': 'geojson'). Optional 'simplify_zoom' and 'alternatives' as for
+    routing.plot_routes_from_names.
+    """
+    data = request.get_json()
+    route = data.get('route', [])
+    if len(route) < 2:
+        return jsonify({'error': 'Need at least two locations in route'}), 400
+    if data.get('format', 'json') not in ('json', 'geojson'):
+        return jsonify({'error': "format must be 'json' or 'geojson'"}), 400
+    simplify_zoom = data.get('simplify_zoom')
+    if simplify_zoom is not None and (type(simplify_zoom) is not int or not 0 <= simplify_zoom <= 22):
+        return jsonify({'error': 'simplify_zoom must be an integer from 0 to 22'}), 400
+    if data.get('alternatives') is not None and data['alternatives'] not in MAP_ALTERNATIVE_MODES:
+        return jsonify({'error': "alternatives must be 'all', 'thin' or 'none'"}), 400
+    options = {field: data.get(field) for field in ('format', 'simplify_zoom', 'alternatives')}
+
+    key = cache_key(route, 0, {**SOLVER_PARAMS, **options}, location_table_version(LOCATIONS_PATH), kind="route_json")
+    if request.if_none_match.contains(key):
+        metrics.inc("route_cache_hits_total", cache="route_json_etag")
+        response = Response(status=304)
+        response.set_etag(key)
+        return response
+
+    result = map_cache.get(key)
+    if result is not None:
+        metrics.inc("route_cache_hits_total", cache="route_json")
+    else:
+        metrics.inc("route_cache_misses_total", cache="route_json")
+        # On a warm worker like the map: routes small enough for the NumPy
+        # engines are solved in-process and would hold this thread's GIL
+        try:
+            result = get_pool().submit({'kind': 'route', 'route': route, **options})
+        except WorkerError as e:
+            return jsonify({'error': str(e)}), 500
+        if result['matrix_estimated']:
+            # Planned on offline estimates during an API outage; retry next time
+            return jsonify(result)
+        map_cache.set(key, result)
+
+    response = jsonify(result)
+    response.set_etag(key)
+    return response
+
+@app.route('/api/optimize-batch', methods=['POST'])
+def optimize_batch_endpoint():
+    data = request.get_json()
+    stop_sets = data.get('routes', [])
+    if not stop_sets:
+        return jsonify({'error': 'No routes given'}), 400
+    df, api_key = get_locations()
+    # One JSON object per line, in completion order; 'index' points back into 'routes'
+    lines = (json.dumps(result) + '\n' for result in optimize_batch(stop_sets, df, api_key))
+    return Response(lines, mimetype='application/x-ndjson')
+
+# --- Asynchronous optimization jobs ---
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json()
+    route = data.get('route', [])
+    if len(route) < 2:
+        return jsonify({'error': 'Need at least two locations in route'}), 400
+    job = get_job_manager().submit(route, data.get('start_index', 0))
+    return jsonify(job.to_dict()), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    events = (sse_format(event) for event in job.iter_events())
+    return Response(events, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
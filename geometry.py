@@ -0,0 +1,97 @@
+import math
+import numpy as np
+
+# Metres per pixel at zoom 0 on the equator for 256 px Web Mercator tiles
+METRES_PER_PIXEL_ZOOM0 = 156543.03392
+# Local equirectangular projection, good to well under 1% over a city
+METRES_PER_DEGREE_LAT = 110540.0
+METRES_PER_DEGREE_LNG = 111320.0
+
+
+def decode_polyline(encoded, precision=5):
+    """
+    Decodes a Google encoded polyline into an (n, 2) float array of [lat, lng].
+
+    Vectorized over the whole string: every character becomes a 5-bit chunk,
+    chunks are summed per value with one reduceat, and the zigzag-encoded
+    deltas are turned into coordinates with one cumulative sum.
+    """
+    if not encoded:
+        return np.empty((0, 2))
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    # A chunk without the 0x20 continuation bit ends a value
+    ends = (chunks & 0x20) == 0
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    position = np.arange(len(chunks)) - np.repeat(starts, np.diff(np.append(starts, len(chunks))))
+    values = np.add.reduceat((chunks & 0x1F) << (5 * position), starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10.0 ** precision
+
+
+def encode_polyline(points, precision=5):
+    """
+    Encodes an (n, 2) array of [lat, lng] as a Google encoded polyline
+    (the inverse of decode_polyline), vectorized the same way.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if not len(points):
+        return ""
+    scaled = np.round(points * 10.0 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    # 5 bits per chunk, at least one chunk per value
+    counts = np.maximum(1, (np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) + 5) // 5)
+    starts = np.cumsum(counts) - counts
+    position = np.arange(counts.sum()) - np.repeat(starts, counts)
+    chunks = (np.repeat(values, counts) >> (5 * position)) & 0x1F
+    chunks[position < np.repeat(counts, counts) - 1] |= 0x20
+    return (chunks + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+def zoom_tolerance_m(zoom, latitude, pixels=1.0):
+    """Ground distance (m) covered by `pixels` screen pixels at a Web Mercator zoom level and latitude."""
+    return pixels * METRES_PER_PIXEL_ZOOM0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def simplify(points, tolerance_m):
+    """
+    Douglas-Peucker simplification of an (n, 2) [lat, lng] array: returns the
+    subset of points (endpoints always kept) such that no dropped point lies
+    more than tolerance_m from the simplified line. Distances are measured to
+    segments in a local metric projection, so closed loops work too.
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    if n <= 2 or tolerance_m <= 0:
+        return points
+    xy = np.column_stack((points[:, 1] * METRES_PER_DEGREE_LNG * math.cos(math.radians(points[:, 0].mean())),
+                          points[:, 0] * METRES_PER_DEGREE_LAT))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a, ab = xy[first], xy[last] - xy[first]
+        offsets = xy[first + 1:last] - a
+        length_sq = ab @ ab
+        if length_sq > 0:
+            t = np.clip(offsets @ ab / length_sq, 0.0, 1.0)
+            offsets = offsets - t[:, None] * ab
+        distance_sq = np.einsum("ij,ij->i", offsets, offsets)
+        farthest = int(np.argmax(distance_sq))
+        if distance_sq[farthest] > tolerance_m ** 2:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+def simplify_for_zoom(points, zoom, pixels=1.0):
+    """Simplifies points so they differ by at most `pixels` on screen at the given zoom level."""
+    points = np.asarray(points, dtype=float)
+    if len(points) <= 2:
+        return points
+    return simplify(points, zoom_tolerance_m(zoom, float(points[:, 0].mean()), pixels))
@@ -0,0 +1,181 @@
+import json
+import time
+import uuid
+import tempfile
+import threading
+import subprocess
+import metrics
+from matrix_transport import matrix_payload
+from optimizer_client import OPTIMIZER_CMD
+from routing import get_distance_and_duration_matrices
+
+# Finished jobs are kept this long for polling before being dropped
+JOB_TTL_SECONDS = 15 * 60
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+
+class Job:
+    def __init__(self, location_names, start_index):
+        self.id = uuid.uuid4().hex
+        self.location_names = location_names
+        self.start_index = start_index
+        self.status = "queued"
+        self.best = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.events = []
+        self.cancelled = False
+        self.process = None
+        self._cond = threading.Condition()
+
+    def _publish(self, event, **fields):
+        with self._cond:
+            if event == "solution":
+                self.best = fields
+            elif event in FINISHED_STATES:
+                self.status = event
+                if event == "done":
+                    self.best = fields
+                elif event == "failed":
+                    self.error = fields.get("error")
+            else:
+                self.status = event
+            self.updated_at = time.time()
+            self.events.append({"event": event, "elapsed_s": round(self.updated_at - self.created_at, 3), **fields})
+            self._cond.notify_all()
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "best": self.best,
+                "error": self.error,
+                "solutions_found": sum(1 for e in self.events if e["event"] == "solution"),
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+
+    def iter_events(self, heartbeat=15):
+        """Yields every event from the start of the job, blocking until it finishes; None marks a heartbeat."""
+        sent = 0
+        while True:
+            with self._cond:
+                if sent == len(self.events) and self.status not in FINISHED_STATES:
+                    self._cond.wait(timeout=heartbeat)
+                pending = self.events[sent:]
+                finished = self.status in FINISHED_STATES
+            sent += len(pending)
+            if not pending and not finished:
+                yield None
+            for event in pending:
+                yield event
+            if finished and sent == len(self.events):
+                return
+
+
+class JobManager:
+    """
+    Runs route optimizations in background threads so HTTP handlers only
+    submit and poll. Each job fetches its matrices, then runs optimizer.py in
+    streaming mode and records every improving solution as it arrives.
+    """
+
+    def __init__(self, df, api_key):
+        # The location table, or a function returning the current one (called per job)
+        self.df = df
+        self.api_key = api_key
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, location_names, start_index=0):
+        job = Job(location_names, start_index)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancelled = True
+        if job.process is not None and job.process.poll() is None:
+            job.process.kill()
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - JOB_TTL_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.status in FINISHED_STATES and j.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        try:
+            job._publish("fetching_matrices")
+            dist_matrix, dur_matrix = get_distance_and_duration_matrices(
+                job.location_names, self.df() if callable(self.df) else self.df, self.api_key)
+            if job.cancelled:
+                job._publish("cancelled")
+                return
+
+            payload = {
+                "location_names": job.location_names,
+                "start_index": job.start_index,
+                "stream": True,
+            }
+            # stderr goes to a temp file: a pipe nobody drains while stdout is
+            # being read would block a chatty solver once its buffer fills
+            with matrix_payload(payload, dist_matrix, dur_matrix) as payload, \
+                    tempfile.TemporaryFile(mode="w+") as stderr:
+                job.process = subprocess.Popen(
+                    OPTIMIZER_CMD,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=stderr,
+                    text=True
+                )
+                # cancel() may have run before job.process was set and found nothing to kill
+                if job.cancelled:
+                    job.process.kill()
+                    job.process.wait()
+                    job._publish("cancelled")
+                    return
+                job._publish("solving")
+                job.process.stdin.write(json.dumps(payload))
+                job.process.stdin.close()
+
+                final = None
+                for line in job.process.stdout:
+                    message = json.loads(line)
+                    event = message.pop("event", "done")
+                    if "error" in message:
+                        job._publish("failed", error=message["error"])
+                        return
+                    job._publish(event, **message)
+                    if event == "done":
+                        final = message
+                        metrics.count_solver_result(final)
+                job.process.wait()
+
+                if job.cancelled:
+                    job._publish("cancelled", best=job.best)
+                elif final is None:
+                    metrics.inc("route_subprocess_failures_total", kind="optimizer")
+                    stderr.seek(0)
+                    job._publish("failed", error=stderr.read() or "Optimizer exited without a result")
+        except Exception as e:
+            job._publish("cancelled" if job.cancelled else "failed", error=str(e))
+
+
+def sse_format(event):
+    """Formats one job event (or a None heartbeat) as a Server-Sent Events frame."""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
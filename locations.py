@@ -0,0 +1,208 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import weakref
+import threading
+import numpy as np
+import pandas as pd
+import metrics
+
+# The location workbook every module reads (columns Name, Latitude, Longitude, ...)
+LOCATIONS_PATH = os.getenv("LOCATIONS_PATH", os.path.join("data", "locations.xlsx"))
+# Where the binary snapshots of workbooks are kept (default = system temp dir)
+SNAPSHOT_DIR = os.getenv("LOCATIONS_SNAPSHOT_DIR") or tempfile.gettempdir()
+# Bump when the snapshot layout changes so old files are rebuilt
+SNAPSHOT_FORMAT = 1
+
+logger = logging.getLogger(__name__)
+
+
+class LocationRegistry:
+    """
+    Indexed, read-only view of the location table for routing lookups.
+
+    Built once from the table: a name -> row dict and contiguous float64
+    latitude/longitude arrays, so coordinates for a k-stop list cost k dict
+    lookups and one gather instead of a scan of the whole table per call.
+    Every routing function that takes the location DataFrame also accepts a
+    registry. Names are matched as strings on both sides, so a numeric Name
+    column can be looked up with 17 or "17".
+
+    Parameters:
+    - names (sequence): Location names; the first row wins for duplicates.
+    - latitudes, longitudes (sequence): Coordinates in the same order.
+    """
+
+    def __init__(self, names, latitudes, longitudes):
+        self.names = list(names)
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        self.index = {}
+        for row, name in enumerate(self.names):
+            self.index.setdefault(str(name), row)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Builds a registry from a table with 'Name', 'Latitude' and 'Longitude' columns."""
+        return cls(df['Name'].tolist(), df['Latitude'].to_numpy(), df['Longitude'].to_numpy())
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return str(name) in self.index
+
+    def rows(self, location_names):
+        """Row numbers of location_names, in order; ValueError for an unknown name."""
+        try:
+            return np.fromiter((self.index[str(name)] for name in location_names), dtype=np.intp,
+                               count=len(location_names))
+        except KeyError as e:
+            raise ValueError(f"Location '{e.args[0]}' not found in location table.") from None
+
+    def coordinates(self, location_names):
+        """Returns a (k, 2) array of [lat, lng] for location_names, in order."""
+        rows = self.rows(location_names)
+        return np.column_stack((self.latitudes[rows], self.longitudes[rows]))
+
+
+# Registries built for DataFrames passed in directly, by id(); dropped when the frame is collected
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def as_location_registry(locations):
+    """
+    Returns locations if it already is a LocationRegistry, else the registry
+    for that DataFrame, built on first use and reused while the same (unmodified)
+    frame object is passed again.
+    """
+    if isinstance(locations, LocationRegistry):
+        return locations
+    key = id(locations)
+    with _registries_lock:
+        registry = _registries.get(key)
+    if registry is None:
+        registry = LocationRegistry.from_dataframe(locations)
+        with _registries_lock:
+            _registries[key] = registry
+        weakref.finalize(locations, _registries.pop, key, None)
+    return registry
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_path(path):
+    """Snapshot file for the workbook at path (one per absolute path)."""
+    name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, f"locations-{name}.npz")
+
+
+def _write_snapshot(df, target, source):
+    # One array per column: numbers and booleans keep their dtype, everything
+    # else is stored as fixed-width unicode ('' for missing cells)
+    columns = {}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if values.dtype.kind in "biuf":
+            columns[f"c{i}"] = values.to_numpy()
+        else:
+            columns[f"c{i}"] = values.where(values.notna(), "").astype(str).to_numpy(dtype=str)
+    meta = dict(source, format=SNAPSHOT_FORMAT, columns=[str(column) for column in df.columns])
+    fd, tmp_path = tempfile.mkstemp(prefix="locations-", suffix=".npz.tmp", dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **columns)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_snapshot(target):
+    with np.load(target, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            return None, meta
+        df = pd.DataFrame({column: data[f"c{i}"] for i, column in enumerate(meta["columns"])})
+    return df, meta
+
+
+def _load_table(path):
+    """
+    Returns the workbook at path as a DataFrame, from its binary snapshot when
+    the snapshot was built from the same file (same mtime and size, or failing
+    that the same SHA-256), else by parsing the workbook and writing a new one.
+    """
+    st = os.stat(path)
+    target = snapshot_path(path)
+    try:
+        df, meta = _read_snapshot(target)
+    except (OSError, ValueError, KeyError):
+        df, meta = None, {}
+    if df is not None:
+        if meta.get("mtime_ns") == st.st_mtime_ns and meta.get("size") == st.st_size:
+            return df
+        if meta.get("sha256") == _file_sha256(path):
+            # Touched or copied but unchanged: keep the snapshot, remember the new mtime
+            _write_snapshot(df, target, dict(meta, mtime_ns=st.st_mtime_ns, size=st.st_size))
+            return df
+
+    with metrics.timed("locations_workbook_parse"):
+        df = pd.read_excel(path)
+    source = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": _file_sha256(path)}
+    try:
+        _write_snapshot(df, target, source)
+        # Read back so callers see the same column types whether or not the snapshot existed
+        df, _ = _read_snapshot(target)
+    except OSError as e:
+        logger.warning("Could not write locations snapshot %s: %s", target, e)
+    return df
+
+
+# path -> (version, DataFrame, LocationRegistry or None), reused until the file changes
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _entry(path):
+    st = os.stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+    with _tables_lock:
+        entry = _tables.get(path)
+        if entry is not None and entry[0] == version:
+            return entry
+    with metrics.timed("locations_load"):
+        entry = (version, _load_table(path), None)
+    with _tables_lock:
+        _tables[path] = entry
+    return entry
+
+
+def load_locations(path=LOCATIONS_PATH):
+    """
+    Returns the location table as a DataFrame, shared by every caller in the
+    process and reloaded only when the workbook changes on disk. Parsing the
+    XLSX happens once per workbook version across processes: later loads read
+    the binary snapshot next to it (see snapshot_path). Treat it as read-only.
+    """
+    return _entry(path)[1]
+
+
+def load_location_registry(path=LOCATIONS_PATH):
+    """Returns the LocationRegistry for load_locations(path), rebuilt only when the workbook changes."""
+    version, df, registry = _entry(path)
+    if registry is None:
+        registry = LocationRegistry.from_dataframe(df)
+        with _tables_lock:
+            if _tables.get(path, (None,))[0] == version:
+                _tables[path] = (version, df, registry)
+    return registry
@@ -0,0 +1,82 @@
+import os
+import atexit
+import logging
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+# Matrices with at least this many stops reach optimizer.py as a memory-mapped .npy
+# file named in the payload instead of JSON lists; below it the text is small anyway
+BINARY_MIN_STOPS = int(os.getenv("MATRIX_BINARY_MIN_STOPS", "100"))
+# Where the .npy files go (default = system temp dir); a tmpfs such as /dev/shm keeps them in RAM
+MATRIX_DIR = os.getenv("MATRIX_TRANSPORT_DIR") or None
+
+logger = logging.getLogger(__name__)
+# Files that could not be removed yet (Windows refuses while a mapping is open); retried at exit
+_undeleted = set()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        _undeleted.discard(path)
+    except FileNotFoundError:
+        _undeleted.discard(path)
+    except OSError as e:
+        logger.warning("Could not remove matrix file %s: %s", path, e)
+        _undeleted.add(path)
+
+
+@atexit.register
+def _remove_leftovers():
+    for path in list(_undeleted):
+        _remove(path)
+
+
+@contextmanager
+def matrix_payload(payload, distance_matrix, time_matrix):
+    """
+    Attaches the distance and time matrices to an optimizer payload.
+
+    Small matrices are added as 'distance_matrix' / 'time_matrix' lists like
+    before. From BINARY_MIN_STOPS stops up both are written once into a
+    (2, N, N) float64 .npy file and only its path ('matrix_file') goes into the
+    JSON, so nothing is formatted as text. The file is deleted when the block
+    exits, so keep the optimizer call inside it.
+
+    Yields:
+    - dict: A copy of payload with the matrices attached.
+    """
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    time_matrix = np.asarray(time_matrix, dtype=float)
+    if len(distance_matrix) < BINARY_MIN_STOPS:
+        yield {**payload, "distance_matrix": distance_matrix.tolist(), "time_matrix": time_matrix.tolist()}
+        return
+
+    fd, path = tempfile.mkstemp(prefix="matrices-", suffix=".npy", dir=MATRIX_DIR)
+    os.close(fd)
+    try:
+        frame = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(2,) + distance_matrix.shape)
+        frame[0] = distance_matrix
+        frame[1] = time_matrix
+        frame.flush()
+        del frame
+        yield {**payload, "matrix_file": path}
+    finally:
+        _remove(path)
+
+
+def load_matrices(payload, mmap=True):
+    """
+    Returns (distance_matrix, time_matrix) from a payload built by matrix_payload.
+
+    A 'matrix_file' is memory-mapped read-only by default, so the optimizer
+    process reads views of the page cache rather than copies. Pass mmap=False
+    when solving inside the process that owns the file: the data is read into
+    memory and the file handle closed at once, so matrix_payload can delete it
+    (Windows will not remove a file that is still mapped).
+    """
+    if "matrix_file" in payload:
+        frame = np.load(payload["matrix_file"], mmap_mode="r" if mmap else None)
+        return frame[0], frame[1]
+    return np.asarray(payload["distance_matrix"], dtype=float), np.asarray(payload["time_matrix"], dtype=float)
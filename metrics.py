@@ -0,0 +1,106 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_METRIC = "route_stage_duration_seconds"
+
+HELP = {
+    STAGE_METRIC: "Latency of each routing pipeline stage.",
+    "route_cache_hits_total": "Requests answered from a cache.",
+    "route_cache_misses_total": "Cache lookups that had to compute the result.",
+    "route_upstream_api_calls_total": "Calls made to Google Maps APIs.",
+    "route_travel_cache_pairs_total": "Origin/destination pairs looked up in the travel-time cache.",
+    "route_matrix_estimated_pairs_total": "Matrix pairs estimated offline because the Distance Matrix API failed.",
+    "route_solver_timeouts_total": "Optimizer runs that stopped on the time limit.",
+    "route_subprocess_failures_total": "Optimizer or map worker processes that failed.",
+}
+
+_lock = threading.Lock()
+_histograms = {}  # stage -> [bucket counts..., +Inf count, sum]
+_counters = {}    # (name, ((label, value), ...)) -> value
+
+
+def observe(stage, seconds):
+    with _lock:
+        hist = _histograms.setdefault(stage, [0] * (len(BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[len(BUCKETS)] += 1
+        hist[-1] += seconds
+
+
+@contextmanager
+def timed(stage):
+    """Records the wall time of the enclosed block under the given stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def count_solver_result(result):
+    """Counts optimizer results that hit the time limit (see 'timed_out' in optimizer.py output)."""
+    if result.get("timed_out"):
+        inc("route_solver_timeouts_total")
+
+
+def drain():
+    """Returns everything recorded so far and resets it; used by worker processes to ship metrics to the parent."""
+    global _histograms, _counters
+    with _lock:
+        snapshot = {"histograms": _histograms, "counters": list(_counters.items())}
+        _histograms, _counters = {}, {}
+    return snapshot
+
+
+def merge(snapshot):
+    """Adds a snapshot from drain() into this process's metrics."""
+    with _lock:
+        for stage, values in snapshot["histograms"].items():
+            hist = _histograms.setdefault(stage, [0] * (len(BUCKETS) + 1) + [0.0])
+            for i, value in enumerate(values):
+                hist[i] += value
+        for key, value in snapshot["counters"]:
+            _counters[key] = _counters.get(key, 0) + value
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render():
+    """Renders all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        if _histograms:
+            lines.append(f"# HELP {STAGE_METRIC} {HELP[STAGE_METRIC]}")
+            lines.append(f"# TYPE {STAGE_METRIC} histogram")
+            for stage, hist in sorted(_histograms.items()):
+                for bound, count in zip(BUCKETS, hist):
+                    lines.append(f'{STAGE_METRIC}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{STAGE_METRIC}_bucket{{stage="{stage}",le="+Inf"}} {hist[len(BUCKETS)]}')
+                lines.append(f'{STAGE_METRIC}_sum{{stage="{stage}"}} {hist[-1]}')
+                lines.append(f'{STAGE_METRIC}_count{{stage="{stage}"}} {hist[len(BUCKETS)]}')
+
+        by_name = {}
+        for (name, labels), value in _counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name in sorted(by_name):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(by_name[name]):
+                lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
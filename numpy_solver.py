@@ -0,0 +1,355 @@
+import os
+import time
+import numpy as np
+from matrix_transport import load_matrices
+
+# Importable without OR-Tools, so the web and Streamlit processes can solve
+# small routes themselves instead of spawning venv_ortools/optimizer.py
+
+# Largest instance (including the start) solved exactly by Held-Karp in "auto" mode
+EXACT_MAX_STOPS = 15
+
+# Largest instance solve_in_process handles with local search; bigger ones go to OR-Tools.
+# Up to this size iterated 2-opt + Or-opt stayed within 0.5% of the OR-Tools route
+# length in a tenth of the time (see benchmarks/bench_local_search.py)
+IN_PROCESS_MAX_STOPS = int(os.getenv("IN_PROCESS_MAX_STOPS", "120"))
+LOCAL_SEARCH_TIME_LIMIT_SECONDS = 10.0
+# Default budget per stop for the iterated local search kicks; kicking also stops
+# after PLATEAU_KICKS in a row fail to shorten the best route
+KICK_SECONDS_PER_STOP = 0.01
+PLATEAU_KICKS = int(os.getenv("PLATEAU_KICKS", "200"))
+# Or-opt moves segments of 1..OR_OPT_MAX_SEGMENT consecutive stops
+OR_OPT_MAX_SEGMENT = 3
+# Improvements smaller than this (in matrix units) are treated as noise
+MIN_IMPROVEMENT = 1e-6
+# Stand-in cost for unreachable pairs so move deltas stay finite
+UNREACHABLE_COST = 1e9
+
+
+def solve_held_karp(distance_matrix, time_matrix, location_names, start_index=0, end_index=None):
+    """
+    Exact open-path TSP by bitmask dynamic programming (Held-Karp). If
+    end_index is given the path is forced to finish there.
+
+    dp[mask, j] is the shortest path that leaves start_index, visits exactly the
+    stops in mask and ends at stop j. Each popcount layer is filled with NumPy
+    gathers over all masks at once, so N=15 takes milliseconds. Memory and time
+    grow as 2^N, so keep N small (see EXACT_MAX_STOPS).
+    """
+    started = time.perf_counter()
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    time_matrix = np.asarray(time_matrix, dtype=float)
+    n = len(distance_matrix)
+    others = np.array([i for i in range(n) if i != start_index], dtype=np.int64)
+    m = len(others)
+
+    if m == 0:
+        order = []
+    else:
+        sub = distance_matrix[np.ix_(others, others)]
+        masks = np.arange(1 << m, dtype=np.int64)
+        popcount = np.zeros(1 << m, dtype=np.int64)
+        for bit in range(m):
+            popcount += (masks >> bit) & 1
+
+        dp = np.full((1 << m, m), np.inf)
+        parent = np.full((1 << m, m), -1, dtype=np.int64)
+        dp[1 << np.arange(m), np.arange(m)] = distance_matrix[start_index, others]
+
+        for size in range(2, m + 1):
+            layer = masks[popcount == size]
+            for j in range(m):
+                sel = layer[((layer >> j) & 1) == 1]
+                # dp[prev, k] is inf for any k outside prev, including j itself
+                candidates = dp[sel ^ (1 << j)] + sub[:, j]
+                best = np.argmin(candidates, axis=1)
+                dp[sel, j] = candidates[np.arange(len(sel)), best]
+                parent[sel, j] = best
+
+        full = (1 << m) - 1
+        if end_index is not None and end_index != start_index:
+            last = int(np.flatnonzero(others == end_index)[0])
+        else:
+            last = int(np.argmin(dp[full]))
+        if not np.isfinite(dp[full, last]):
+            return {"error": "No solution found", "solver_status": "ROUTING_INFEASIBLE",
+                    "solve_seconds": time.perf_counter() - started, "timed_out": False,
+                    "stop_reason": "infeasible", "engine": "held_karp"}
+
+        order = []
+        mask, j = full, last
+        while j != -1:
+            order.append(j)
+            mask, j = mask ^ (1 << j), int(parent[mask, j])
+        order.reverse()
+
+    route_indices = [start_index] + [int(others[j]) for j in order]
+    legs = list(zip(route_indices[:-1], route_indices[1:]))
+    total_distance = sum(distance_matrix[a, b] for a, b in legs)
+    total_time = sum(time_matrix[a, b] for a, b in legs)
+    return {
+        "route": [location_names[i] for i in route_indices],
+        "total_distance_km": float(total_distance / 1000),
+        "total_time_minutes": float(total_time / 60),
+        "solver_status": "ROUTING_OPTIMAL",
+        "solve_seconds": time.perf_counter() - started,
+        "timed_out": False,
+        "stop_reason": "optimal",
+        "engine": "held_karp",
+    }
+
+
+def warm_start_order(distance_matrix, location_names, start_index, initial_route):
+    """
+    Turns a previous route into a visiting order (node indices, start excluded)
+    for the current stop list: stops that were dropped are skipped and new
+    stops are inserted one by one at their cheapest position.
+    """
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    name_index = {name: i for i, name in enumerate(location_names)}
+    order = [name_index[name] for name in dict.fromkeys(initial_route)
+             if name in name_index and name_index[name] != start_index]
+    kept = set(order)
+    for node in range(len(location_names)):
+        if node == start_index or node in kept:
+            continue
+        path = np.array([start_index] + order)
+        # Cost of putting node after path[k]: detour to the next stop, or just the leg at the open end
+        added = distance_matrix[path, node]
+        added[:-1] += distance_matrix[node, path[1:]] - distance_matrix[path[:-1], path[1:]]
+        order.insert(int(np.argmin(added)), node)
+    return order
+
+
+def nearest_neighbour_order(distance_matrix, start_index=0):
+    """Greedy construction: from the start, always drive to the closest unvisited stop."""
+    n = len(distance_matrix)
+    visited = np.zeros(n, dtype=bool)
+    visited[start_index] = True
+    route = [start_index]
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, distance_matrix[route[-1]])
+        nxt = int(np.argmin(row))
+        visited[nxt] = True
+        route.append(nxt)
+    return route
+
+
+def _best_two_opt(distance_matrix, route):
+    # Reversing route[i..j] (1 <= i < j) replaces edges (i-1, i) and (j, j+1) and
+    # flips the direction of every edge in between, which matters when the matrix
+    # is asymmetric. Prefix sums of forward and backward edge costs give the
+    # internal change for all (i, j) at once.
+    n = len(route)
+    forward = np.concatenate(([0.0], np.cumsum(distance_matrix[route[:-1], route[1:]])))
+    backward = np.concatenate(([0.0], np.cumsum(distance_matrix[route[1:], route[:-1]])))
+    i = np.arange(1, n)[:, None]
+    j = np.arange(1, n)[None, :]
+    a, b, c = route[i - 1], route[i], route[j]
+    d = route[np.minimum(j + 1, n - 1)]
+    has_next = j < n - 1
+
+    delta = (distance_matrix[a, c] - distance_matrix[a, b]
+             + (backward[j] - backward[i]) - (forward[j] - forward[i])
+             + np.where(has_next, distance_matrix[b, d] - distance_matrix[c, d], 0.0))
+    delta = np.where(j > i, delta, np.inf)
+    flat = int(np.argmin(delta))
+    bi, bj = divmod(flat, n - 1)
+    return float(delta.flat[flat]), bi + 1, bj + 1
+
+
+def _best_or_opt(distance_matrix, route, length):
+    # Moves route[i..i+length-1] (kept in order) to sit after route[k], for every
+    # segment start i >= 1 and every insertion point k outside the segment
+    n = len(route)
+    if n - 1 < length + 1:
+        return np.inf, 0, 0
+    i = np.arange(1, n - length + 1)[:, None]
+    k = np.arange(n)[None, :]
+    first, last, prev = route[i], route[i + length - 1], route[i - 1]
+    after = route[np.minimum(i + length, n - 1)]
+    segment_has_next = i + length <= n - 1
+    removed = (distance_matrix[prev, first]
+               + np.where(segment_has_next, distance_matrix[last, after] - distance_matrix[prev, after], 0.0))
+
+    u = route[k]
+    v = route[np.minimum(k + 1, n - 1)]
+    inserted = distance_matrix[u, first] + np.where(
+        k < n - 1, distance_matrix[last, v] - distance_matrix[u, v], 0.0)
+
+    valid = (k < i - 1) | (k >= i + length)
+    delta = np.where(valid, inserted - removed, np.inf)
+    flat = int(np.argmin(delta))
+    bi, bk = divmod(flat, n)
+    return float(delta.flat[flat]), bi + 1, bk
+
+
+def _descend(search_matrix, route, stop_at):
+    # Applies the best 2-opt or Or-opt move until none improves or stop_at (perf_counter) passes.
+    # Returns (route, timed_out).
+    while True:
+        if time.perf_counter() >= stop_at:
+            return route, True
+        delta, i, j = _best_two_opt(search_matrix, route) if len(route) > 2 else (np.inf, 0, 0)
+        move = ("two_opt", i, j, 0)
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            or_delta, seg, k = _best_or_opt(search_matrix, route, length)
+            if or_delta < delta:
+                delta, move = or_delta, ("or_opt", seg, k, length)
+        if delta > -MIN_IMPROVEMENT:
+            return route, False
+
+        kind, i, j, length = move
+        if kind == "two_opt":
+            route = route.copy()
+            route[i:j + 1] = route[i:j + 1][::-1]
+        else:
+            segment = route[i:i + length]
+            rest = np.concatenate((route[:i], route[i + length:]))
+            # Insertion point k was indexed in the old route; shift it if it lay after the segment
+            position = j + 1 if j < i else j + 1 - length
+            route = np.concatenate((rest[:position], segment, rest[position:]))
+
+
+def _double_bridge(route, rng):
+    # Random A B C D -> A C B D reshuffle (A keeps the start); a kick 2-opt and Or-opt cannot undo in one move
+    cuts = np.sort(rng.choice(np.arange(1, len(route)), 3, replace=False))
+    a, b, c = cuts
+    return np.concatenate((route[:a], route[b:c], route[a:b], route[c:]))
+
+
+def solve_local_search(distance_matrix, time_matrix, location_names, start_index=0, on_solution=None,
+                       time_limit_seconds=None, deadline=None, initial_route=None, seed=0):
+    """
+    Open-path TSP heuristic in pure NumPy: nearest-neighbour construction (or
+    the previous route when initial_route is given) followed by best-improvement
+    2-opt and Or-opt until no move shortens the route. The remaining budget is
+    spent on iterated local search: double-bridge kicks of the best route, each
+    followed by another descent, keeping whichever route is shortest.
+
+    Takes and returns the same shapes as optimizer.solve_open_tsp. Each pass
+    scores every move with one vectorized O(N^2) evaluation, so it suits the
+    few-dozen-stop routes the dashboard plans; large instances belong to OR-Tools.
+
+    Parameters:
+    - time_limit_seconds (float): Budget (default = KICK_SECONDS_PER_STOP * N,
+      capped at LOCAL_SEARCH_TIME_LIMIT_SECONDS).
+    - deadline (float): Unix time the answer is needed by; shrinks the budget.
+    - seed (int): Seed for the kicks, so repeated calls return the same route.
+    """
+    started = time.perf_counter()
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    time_matrix = np.asarray(time_matrix, dtype=float)
+    search_matrix = np.nan_to_num(distance_matrix, nan=UNREACHABLE_COST, posinf=UNREACHABLE_COST)
+    n = len(distance_matrix)
+
+    if time_limit_seconds is None:
+        budget = min(KICK_SECONDS_PER_STOP * n, LOCAL_SEARCH_TIME_LIMIT_SECONDS)
+    else:
+        budget = float(time_limit_seconds)
+    if deadline is not None and deadline - time.time() < budget:
+        budget = max(deadline - time.time(), 0.0)
+    stop_at = started + budget
+
+    if initial_route:
+        route = [start_index] + warm_start_order(search_matrix, location_names, start_index, initial_route)
+    else:
+        route = nearest_neighbour_order(search_matrix, start_index)
+    route = np.array(route, dtype=np.int64)
+
+    def length(path):
+        return search_matrix[path[:-1], path[1:]].sum()
+
+    def snapshot(path):
+        legs = (path[:-1], path[1:])
+        return {
+            "route": [location_names[i] for i in path],
+            "total_distance_km": float(distance_matrix[legs].sum() / 1000),
+            "total_time_minutes": float(time_matrix[legs].sum() / 60),
+        }
+
+    best, timed_out = _descend(search_matrix, route, stop_at)
+    best_length = length(best)
+    if on_solution is not None:
+        on_solution(snapshot(best))
+
+    # Kicks need at least three movable stops; below that the descent is already optimal
+    rng = np.random.default_rng(seed)
+    kicks, stale = 0, 0
+    stop_reason = "time_limit" if timed_out else "local_optimum"
+    while not timed_out and n > 4:
+        if stale >= PLATEAU_KICKS:
+            stop_reason = "plateau"
+            break
+        if time.perf_counter() >= stop_at:
+            stop_reason = "time_limit"
+            break
+        # A kick cut short by the budget is simply discarded; the best route is still a local optimum
+        candidate, cut = _descend(search_matrix, _double_bridge(best, rng), stop_at)
+        kicks += 1
+        stale += 1
+        if not cut and length(candidate) < best_length - MIN_IMPROVEMENT:
+            best, best_length, stale = candidate, length(candidate), 0
+            if on_solution is not None:
+                on_solution(snapshot(best))
+
+    result = snapshot(best)
+    result.update({
+        "solver_status": "ROUTING_SUCCESS",
+        "solve_seconds": time.perf_counter() - started,
+        "time_budget_seconds": budget,
+        "timed_out": timed_out,
+        "stop_reason": stop_reason,
+        "engine": "local_search",
+        "kicks": kicks,
+    })
+    return result
+
+
+def in_process_engine(payload):
+    """
+    Returns the NumPy engine ("held_karp" or "local_search") solve_in_process
+    would use for an optimizer payload, or None if the payload needs OR-Tools
+    (bigger instances, fleets, decomposition, streaming, an explicit OR-Tools
+    engine, or an explicit Held-Karp request above EXACT_MAX_STOPS).
+    """
+    engine = payload.get("engine", "auto")
+    if payload.get("stream") or "num_vehicles" in payload:
+        return None
+    num_locations = len(payload["location_names"])
+    if engine == "held_karp":
+        # 2^N memory: never let a request blow up the web or Streamlit process
+        return engine if num_locations <= EXACT_MAX_STOPS else None
+    if engine == "local_search":
+        return engine
+    if engine == "auto":
+        if num_locations <= EXACT_MAX_STOPS:
+            return "held_karp"
+        if num_locations <= IN_PROCESS_MAX_STOPS:
+            return "local_search"
+    return None
+
+
+def solve_in_process(payload):
+    """
+    Solves an optimizer.py payload here when it is small enough for the NumPy
+    engines to match OR-Tools: Held-Karp up to EXACT_MAX_STOPS, local search up
+    to IN_PROCESS_MAX_STOPS (see in_process_engine).
+
+    Returns:
+    - dict: Same result optimizer.py would print, or None when the payload needs
+      OR-Tools and the caller should hand it to the optimizer process.
+    """
+    engine = in_process_engine(payload)
+    if engine is None:
+        return None
+
+    names = payload["location_names"]
+    # Read, not mapped: the caller deletes the matrix file as soon as this returns
+    distance_matrix, time_matrix = load_matrices(payload, mmap=False)
+    start_index = payload.get("start_index", 0)
+    if engine == "held_karp":
+        return solve_held_karp(distance_matrix, time_matrix, names, start_index)
+    return solve_local_search(distance_matrix, time_matrix, names, start_index,
+                              time_limit_seconds=payload.get("time_limit_seconds"),
+                              deadline=payload.get("deadline"), initial_route=payload.get("initial_route"))
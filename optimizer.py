@@ -1,10 +1,124 @@
+import os
 import json
 import sys
+import time
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from numpy_solver import (EXACT_MAX_STOPS, OR_OPT_MAX_SEGMENT, MIN_IMPROVEMENT, UNREACHABLE_COST,
+                          solve_held_karp, solve_local_search, warm_start_order)
+from matrix_transport import load_matrices
+from solver_settings import (BASE_TIME_LIMIT_SECONDS, PER_STOP_TIME_LIMIT_SECONDS, MAX_TIME_LIMIT_SECONDS,
+                             MIN_TIME_LIMIT_SECONDS, DEADLINE_MARGIN_SECONDS, PLATEAU_FRACTION, MIN_PLATEAU_SECONDS,
+                             PLATEAU_GAP, WARM_START_PLATEAU_FRACTION, FIRST_SOLUTION_STRATEGY,
+                             LOCAL_SEARCH_METAHEURISTIC, DECOMPOSE_MIN_STOPS, DECOMPOSE_CLUSTER_SIZE, SEAM_WINDOW,
+                             GLOBAL_NEIGHBOURS, GLOBAL_PASS_SECONDS_PER_STOP)
 
 
-def solve_open_tsp(distance_matrix, time_matrix, location_names, start_index=0):
+def _to_int_matrix(matrix):
+    # Unreachable pairs come back from the Distance Matrix API as inf
+    finite = np.nan_to_num(matrix, nan=1e9, posinf=1e9, neginf=0)
+    return finite.astype(np.int64)
+
+
+def _read_route(routing, manager, next_value, location_names, extended_distance, extended_time, vehicle=0):
+    index = routing.Start(vehicle)
+    route = []
+    total_distance = 0
+    total_time = 0
+    while not routing.IsEnd(index):
+        node_index = manager.IndexToNode(index)
+        route.append(location_names[node_index])
+        next_index = next_value(index)
+        next_node = manager.IndexToNode(next_index)
+        total_distance += extended_distance[node_index][next_node]
+        total_time += extended_time[node_index][next_node]
+        index = next_index
+
+    return {
+        "route": route,
+        "total_distance_km": float(total_distance / 1000),
+        "total_time_minutes": float(total_time / 60)
+    }
+
+
+# Keys of the stdin payload forwarded to solve_open_tsp as search options
+SEARCH_OPTION_KEYS = ("time_limit_seconds", "deadline", "plateau_seconds", "plateau_gap")
+
+
+# (first solution strategy, local search metaheuristic) pairs raced by the "portfolio" engine
+PORTFOLIO_STRATEGIES = (
+    ("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH"),
+    ("SAVINGS", "GUIDED_LOCAL_SEARCH"),
+    ("CHRISTOFIDES", "GUIDED_LOCAL_SEARCH"),
+    ("PATH_CHEAPEST_ARC", "SIMULATED_ANNEALING"),
+    ("PATH_CHEAPEST_ARC", "TABU_SEARCH"),
+    ("SAVINGS", "TABU_SEARCH"),
+    ("LOCAL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH"),
+    ("CHRISTOFIDES", "SIMULATED_ANNEALING"),
+)
+
+
+def default_time_budget(num_locations):
+    return min(BASE_TIME_LIMIT_SECONDS + PER_STOP_TIME_LIMIT_SECONDS * num_locations, MAX_TIME_LIMIT_SECONDS)
+
+
+def solve_open_tsp(distance_matrix, time_matrix, location_names, start_index=0, on_solution=None, engine="auto",
+                   time_limit_seconds=None, deadline=None, plateau_seconds=None, plateau_gap=PLATEAU_GAP,
+                   initial_route=None):
+    """
+    Solves the open TSP starting at start_index and ending anywhere.
+
+    engine is "held_karp" (exact), "ortools" (guided local search), "portfolio"
+    (several OR-Tools strategies raced across cores, see solve_portfolio),
+    "local_search" (NumPy 2-opt/Or-opt, see numpy_solver) or "auto", which uses Held-Karp up to EXACT_MAX_STOPS locations and OR-Tools above.
+
+    If on_solution is given it is called with a result dict (same shape as the
+    return value) each time the search finds an improving solution.
+
+    OR-Tools search options:
+    - time_limit_seconds (float): Budget; defaults to default_time_budget(N).
+    - deadline (float): Unix time the answer is needed by; shrinks the budget.
+    - plateau_seconds (float): Stop after this long without a significant improvement
+      (default = PLATEAU_FRACTION of the budget).
+    - plateau_gap (float): Relative improvement below which a new best does not count.
+    - initial_route (list): Previous route (location names) to warm-start from after
+      stops were added or removed; new stops are inserted where they are cheapest.
+
+    The result's 'stop_reason' says why the search ended: "optimal", "plateau",
+    "time_limit", "deadline", "completed" or "local_optimum".
+    """
+    if engine == "auto":
+        engine = "held_karp" if len(distance_matrix) <= EXACT_MAX_STOPS else "ortools"
+    if engine == "held_karp":
+        if len(distance_matrix) > EXACT_MAX_STOPS:
+            raise ValueError(f"held_karp needs 2^N memory; use it for at most {EXACT_MAX_STOPS} locations.")
+        result = solve_held_karp(distance_matrix, time_matrix, location_names, start_index)
+        if on_solution is not None and "error" not in result:
+            on_solution(result)
+        return result
+    if engine == "portfolio":
+        result = solve_portfolio(distance_matrix, time_matrix, location_names, start_index,
+                                 time_limit_seconds=time_limit_seconds, deadline=deadline,
+                                 plateau_seconds=plateau_seconds, plateau_gap=plateau_gap, initial_route=initial_route)
+        if on_solution is not None and "error" not in result:
+            on_solution(result)
+        return result
+    if engine == "local_search":
+        return solve_local_search(distance_matrix, time_matrix, location_names, start_index, on_solution,
+                                  time_limit_seconds=time_limit_seconds, deadline=deadline,
+                                  initial_route=initial_route)
+    if engine != "ortools":
+        raise ValueError(f"Unknown engine '{engine}'. "
+                         f"Choose from: 'auto', 'held_karp', 'ortools', 'portfolio', 'local_search'.")
+    return _solve_ortools(distance_matrix, time_matrix, location_names, start_index, on_solution,
+                          time_limit_seconds, deadline, plateau_seconds, plateau_gap, initial_route)
+
+
+def _extend_matrices(distance_matrix, time_matrix):
+    # Adds a dummy end node (last row/column) that every stop reaches at zero
+    # cost, so routes may finish anywhere
     num_locations = len(distance_matrix)
     extended_size = num_locations + 1
     extended_distance = np.full((extended_size, extended_size), 1e9)
@@ -18,75 +132,679 @@ def solve_open_tsp(distance_matrix, time_matrix, location_names, start_index=0):
         extended_distance[-1, i] = 0
         extended_time[i, -1] = 0
         extended_time[-1, i] = 0
+    return extended_distance, extended_time
 
-    manager = pywrapcp.RoutingIndexManager(extended_size, 1, [start_index], [extended_size - 1])
-    routing = pywrapcp.RoutingModel(manager)
-
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return int(extended_distance[from_node][to_node])
 
-    def time_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return int(extended_time[from_node][to_node])
+def _build_model(extended_distance, extended_time, starts, ends):
+    extended_size = len(extended_distance)
+    manager = pywrapcp.RoutingIndexManager(extended_size, len(starts), list(starts), list(ends))
+    routing = pywrapcp.RoutingModel(manager)
 
-    distance_callback_index = routing.RegisterTransitCallback(distance_callback)
-    time_callback_index = routing.RegisterTransitCallback(time_callback)
+    # Integer matrices registered once are evaluated natively by the solver,
+    # instead of calling back into Python for every arc it looks at
+    int_distance = _to_int_matrix(extended_distance)
+    int_time = _to_int_matrix(extended_time)
+    distance_callback_index = routing.RegisterTransitMatrix(int_distance.tolist())
+    time_callback_index = routing.RegisterTransitMatrix(int_time.tolist())
 
     routing.SetArcCostEvaluatorOfAllVehicles(distance_callback_index)
 
     routing.AddDimension(
         time_callback_index, 0,
-        int(np.max(extended_time) * extended_size),
+        int(int_time.max()) * extended_size,
         True,
         "Time"
     )
+    return manager, routing
 
+
+def _search(routing, num_locations, on_improvement=None, time_limit_seconds=None, deadline=None,
+            plateau_seconds=None, plateau_gap=PLATEAU_GAP, initial_routes=None,
+            first_solution_strategy=FIRST_SOLUTION_STRATEGY, local_search_metaheuristic=LOCAL_SEARCH_METAHEURISTIC):
+    """
+    Runs guided local search under the adaptive budget and plateau rule.
+    on_improvement() is called (with the model's current assignment live) on each new best.
+    initial_routes (per-vehicle lists of routing indices) replaces the
+    first-solution heuristic with a known assignment.
+    Returns (solution or None, details dict).
+    """
     search_params = pywrapcp.DefaultRoutingSearchParameters()
-    search_params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    search_params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-    search_params.time_limit.seconds = 30
+    search_params.first_solution_strategy = getattr(
+        routing_enums_pb2.FirstSolutionStrategy, first_solution_strategy)
+    search_params.local_search_metaheuristic = getattr(
+        routing_enums_pb2.LocalSearchMetaheuristic, local_search_metaheuristic)
+    budget = time_limit_seconds if time_limit_seconds is not None else default_time_budget(num_locations)
+    budget_reason = "time_limit"
+    if deadline is not None:
+        remaining = deadline - time.time() - DEADLINE_MARGIN_SECONDS
+        if remaining < budget:
+            budget, budget_reason = max(remaining, MIN_TIME_LIMIT_SECONDS), "deadline"
+    if plateau_seconds is None:
+        fraction = WARM_START_PLATEAU_FRACTION if initial_routes is not None else PLATEAU_FRACTION
+        plateau_seconds = max(fraction * budget, MIN_PLATEAU_SECONDS)
+    search_params.time_limit.FromMilliseconds(int(budget * 1000))
     search_params.log_search = False
 
-    solution = routing.SolveWithParameters(search_params)
+    state = {"best": None, "improved_at": None, "stop_reason": None}
+
+    # Guided local search also accepts non-improving moves, so only new bests
+    # are forwarded, and only improvements above plateau_gap reset the clock
+    def at_solution():
+        now = time.perf_counter()
+        cost = routing.CostVar().Value()
+        best = state["best"]
+        if best is None or cost < best:
+            if best is None or best - cost > plateau_gap * best:
+                state["improved_at"] = now
+            state["best"] = cost
+            if on_improvement is not None:
+                on_improvement()
+        if now - state["improved_at"] >= plateau_seconds:
+            state["stop_reason"] = "plateau"
+            routing.solver().FinishCurrentSearch()
+
+    routing.AddAtSolutionCallback(at_solution)
+
+    started = time.perf_counter()
+    if initial_routes is not None:
+        routing.CloseModelWithParameters(search_params)
+        initial = routing.ReadAssignmentFromRoutes(initial_routes, True)
+        solution = routing.SolveFromAssignmentWithParameters(initial, search_params) if initial else None
+    else:
+        solution = routing.SolveWithParameters(search_params)
+    solve_seconds = time.perf_counter() - started
+
+    status = routing_enums_pb2.RoutingSearchStatus.Value.Name(routing.status())
+    stop_reason = state["stop_reason"]
+    if stop_reason is None:
+        # Guided local search never proves optimality, so it reports success even when cut off
+        cut_off = (status in ("ROUTING_FAIL_TIMEOUT", "ROUTING_PARTIAL_SUCCESS_LOCAL_OPTIMUM_NOT_REACHED")
+                   or solve_seconds >= budget * 0.99)
+        stop_reason = budget_reason if cut_off else "completed"
+    timed_out = stop_reason in ("time_limit", "deadline")
+    details = {"solver_status": status, "solve_seconds": solve_seconds, "time_budget_seconds": budget,
+               "timed_out": timed_out, "stop_reason": stop_reason, "engine": "ortools",
+               "warm_start": initial_routes is not None,
+               "strategy": [first_solution_strategy, local_search_metaheuristic]}
+    return solution, details
+
+
+def _solve_ortools(distance_matrix, time_matrix, location_names, start_index=0, on_solution=None,
+                   time_limit_seconds=None, deadline=None, plateau_seconds=None, plateau_gap=PLATEAU_GAP,
+                   initial_route=None, first_solution_strategy="PATH_CHEAPEST_ARC",
+                   local_search_metaheuristic="GUIDED_LOCAL_SEARCH"):
+    num_locations = len(distance_matrix)
+    extended_distance, extended_time = _extend_matrices(distance_matrix, time_matrix)
+    manager, routing = _build_model(extended_distance, extended_time, [start_index], [num_locations])
+
+    def report_solution():
+        on_solution(_read_route(
+            routing, manager, lambda index: routing.NextVar(index).Value(),
+            location_names, extended_distance, extended_time))
+
+    initial_routes = None
+    if initial_route:
+        order = warm_start_order(distance_matrix, location_names, start_index, initial_route)
+        initial_routes = [[manager.NodeToIndex(node) for node in order]]
+
+    solution, details = _search(routing, num_locations, report_solution if on_solution else None,
+                                time_limit_seconds, deadline, plateau_seconds, plateau_gap, initial_routes,
+                                first_solution_strategy, local_search_metaheuristic)
 
     if solution:
-        index = routing.Start(0)
-        route = []
-        total_distance = 0
-        total_time = 0
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            route.append(location_names[node_index])
-            next_index = solution.Value(routing.NextVar(index))
-            next_node = manager.IndexToNode(next_index)
-            total_distance += extended_distance[node_index][next_node]
-            total_time += extended_time[node_index][next_node]
-            index = next_index
+        result = _read_route(
+            routing, manager, lambda index: solution.Value(routing.NextVar(index)),
+            location_names, extended_distance, extended_time)
+        result.update(details)
+        return result
+    else:
+        return {"error": "No solution found", **details}
+
+
+def _portfolio_member(args):
+    distance_matrix, time_matrix, location_names, start_index, strategy, options = args
+    try:
+        return _solve_ortools(distance_matrix, time_matrix, location_names, start_index,
+                              first_solution_strategy=strategy[0], local_search_metaheuristic=strategy[1], **options)
+    except Exception as e:
+        return {"error": str(e), "strategy": list(strategy)}
+
+
+def solve_portfolio(distance_matrix, time_matrix, location_names, start_index=0, strategies=PORTFOLIO_STRATEGIES,
+                    max_workers=None, time_limit_seconds=None, deadline=None, plateau_seconds=None,
+                    plateau_gap=PLATEAU_GAP, initial_route=None):
+    """
+    Races several first-solution / metaheuristic combinations in a process pool
+    under one shared deadline and returns the shortest route found. Members
+    beyond max_workers (default = CPU count) are dropped rather than queued,
+    since a queued member would only start once the deadline is mostly spent.
+
+    The result has the usual solve_open_tsp fields of the winner, its
+    'strategy', and 'portfolio': a summary of every member's outcome.
+    """
+    num_locations = len(distance_matrix)
+    budget = time_limit_seconds if time_limit_seconds is not None else default_time_budget(num_locations)
+    shared_deadline = time.time() + budget
+    if deadline is not None:
+        shared_deadline = min(shared_deadline, deadline)
+    options = {"deadline": shared_deadline, "time_limit_seconds": budget, "plateau_seconds": plateau_seconds,
+               "plateau_gap": plateau_gap, "initial_route": initial_route}
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    time_matrix = np.asarray(time_matrix, dtype=float)
+
+    workers = max(1, min(len(strategies), max_workers or os.cpu_count() or 1))
+    started = time.perf_counter()
+    jobs = [(distance_matrix, time_matrix, location_names, start_index, strategy, options)
+            for strategy in strategies[:workers]]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_portfolio_member, jobs))
+
+    summary = [{"strategy": r.get("strategy"), "total_distance_km": r.get("total_distance_km"),
+                "solve_seconds": r.get("solve_seconds"), "stop_reason": r.get("stop_reason"),
+                "error": r.get("error")} for r in results]
+    solved = [r for r in results if "error" not in r]
+    if not solved:
+        return {"error": "No solution found", "engine": "portfolio", "portfolio": summary}
+    best = min(solved, key=lambda r: r["total_distance_km"])
+    return {**best, "engine": "portfolio", "solve_seconds": time.perf_counter() - started, "portfolio": summary}
+
+
+def cluster_stops(coordinates, num_clusters, iterations=30, seed=0):
+    """
+    k-means over (Latitude, Longitude) pairs, with longitude scaled by
+    cos(latitude) so clusters are roughly round on the ground.
+    Returns (labels, centroids) in the projected plane.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    points = np.column_stack([coordinates[:, 1] * np.cos(np.radians(coordinates[:, 0].mean())), coordinates[:, 0]])
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), num_clusters, replace=False)]
+    for _ in range(iterations):
+        labels = ((points[:, None, :] - centroids[None]) ** 2).sum(axis=2).argmin(axis=1)
+        counts = np.bincount(labels, minlength=num_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, points)
+        updated = sums / np.maximum(counts, 1)[:, None]
+        empty = counts == 0
+        updated[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    labels = ((points[:, None, :] - centroids[None]) ** 2).sum(axis=2).argmin(axis=1)
+    return labels, centroids
+
+
+def _solve_path(args):
+    # Visiting order (local indices) from start to end, or open-ended if end is None
+    distance_matrix, time_matrix, start, end, time_limit_seconds = args
+    n = len(distance_matrix)
+    names = list(range(n))
+    if n <= EXACT_MAX_STOPS:
+        return solve_held_karp(distance_matrix, time_matrix, names, start, end)["route"]
+    if end is None:
+        return _solve_ortools(distance_matrix, time_matrix, names, start, time_limit_seconds=time_limit_seconds)["route"]
+
+    manager, routing = _build_model(distance_matrix, time_matrix, [start], [end])
+    solution, details = _search(routing, n, time_limit_seconds=time_limit_seconds)
+    if not solution:
+        raise RuntimeError(f"No path found for a cluster of {n} stops ({details['solver_status']})")
+    order = []
+    index = routing.Start(0)
+    while not routing.IsEnd(index):
+        order.append(manager.IndexToNode(index))
+        index = solution.Value(routing.NextVar(index))
+    order.append(end)
+    return order
+
+
+def _nearest_neighbours(distance_matrix, k, chunk=512):
+    # k nearest other stops per stop by round-trip distance, computed in row
+    # chunks so no second N x N array is held
+    n = len(distance_matrix)
+    k = min(k, n - 1)
+    near = np.empty((n, k), dtype=np.intp)
+    for lo in range(0, n, chunk):
+        rows = np.arange(lo, min(n, lo + chunk))
+        cost = distance_matrix[rows] + distance_matrix[:, rows].T
+        cost[np.arange(len(rows)), rows] = np.inf
+        candidates = np.argpartition(cost, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(cost, candidates, axis=1), axis=1)
+        near[rows] = np.take_along_axis(candidates, order, axis=1)
+    return near
+
+
+def _improve_globally(distance_matrix, route, stop_at, neighbours=GLOBAL_NEIGHBOURS, seed=0):
+    """
+    Time-budgeted improvement of a whole open route (start fixed).
 
+    First-improvement 2-opt and Or-opt, trying only moves that create an edge
+    from a stop to one of its nearest neighbours, driven by a queue of stops
+    whose surroundings changed. Once no move helps, the rest of the budget goes
+    to iterated local search: swap two short adjacent segments somewhere on the
+    route, descend again from the stops around the cut points, and keep the
+    result only if the route got shorter. Handles asymmetric matrices.
+    Returns (route, moves) at stop_at, or earlier for tiny routes.
+    """
+    d = np.nan_to_num(np.asarray(distance_matrix, dtype=float), nan=UNREACHABLE_COST, posinf=UNREACHABLE_COST)
+    n = len(route)
+    if n < 4 or time.perf_counter() >= stop_at:
+        return list(route), 0
+    near = _nearest_neighbours(d, neighbours)
+    rng = np.random.default_rng(seed)
+    state = {"route": list(route), "moves": 0}
+    pos = np.empty(n, dtype=np.intp)
+
+    def reindex():
+        pos[state["route"]] = np.arange(n)
+        path = np.asarray(state["route"])
+        state["forward"] = np.concatenate(([0.0], np.cumsum(d[path[:-1], path[1:]])))
+        state["backward"] = np.concatenate(([0.0], np.cumsum(d[path[1:], path[:-1]])))
+
+    def try_two_opt(a):
+        # Reverse route[i..j] so that a -> c becomes an edge (c a neighbour of a)
+        route, forward, backward = state["route"], state["forward"], state["backward"]
+        i = pos[a] + 1
+        if i >= n:
+            return None
+        b = route[i]
+        for c in near[a]:
+            j = pos[c]
+            if j <= i:
+                continue
+            delta = (d[a, c] - d[a, b] + (backward[j] - backward[i]) - (forward[j] - forward[i])
+                     + (d[b, route[j + 1]] - d[c, route[j + 1]] if j < n - 1 else 0.0))
+            if delta < -MIN_IMPROVEMENT:
+                route[i:j + 1] = route[i:j + 1][::-1]
+                return [a, b, c] + ([route[j + 1]] if j < n - 1 else [])
+        return None
+
+    def try_or_opt(first):
+        # Move the segment starting at first to sit right after one of its neighbours
+        route = state["route"]
+        i = pos[first]
+        if i == 0:
+            return None
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            if i + length > n:
+                break
+            last, prev = route[i + length - 1], route[i - 1]
+            after = route[i + length] if i + length < n else None
+            removed = d[prev, first] + (d[last, after] - d[prev, after] if after is not None else 0.0)
+            for u in near[first]:
+                k = pos[u]
+                if i - 1 <= k <= i + length - 1:
+                    continue
+                v = route[k + 1] if k + 1 < n else None
+                added = d[u, first] + (d[last, v] - d[u, v] if v is not None else 0.0)
+                if added - removed < -MIN_IMPROVEMENT:
+                    segment = route[i:i + length]
+                    del route[i:i + length]
+                    insert_at = k + 1 if k < i else k + 1 - length
+                    route[insert_at:insert_at] = segment
+                    return [prev, first, last, u] + [x for x in (after, v) if x is not None]
+        return None
+
+    def descend(queue):
+        queued = np.zeros(n, dtype=bool)
+        queued[list(queue)] = True
+        while queue:
+            if time.perf_counter() >= stop_at:
+                return False
+            a = queue.popleft()
+            queued[a] = False
+            touched = try_two_opt(a) or try_or_opt(a)
+            if touched:
+                state["moves"] += 1
+                reindex()
+                for node in touched:
+                    if not queued[node]:
+                        queued[node] = True
+                        queue.append(node)
+        return True
+
+    reindex()
+    descend(deque(state["route"]))
+    # Kicks: route[p:q] and route[q:r] trade places (short segments, so the
+    # change stays local and the descent after it is cheap)
+    max_segment = max(2, min(30, (n - 1) // 3))
+    while time.perf_counter() < stop_at and n > 6:
+        best_route, best_length, best_moves = list(state["route"]), state["forward"][-1], state["moves"]
+        p = int(rng.integers(1, n - 2))
+        q = min(n - 1, p + int(rng.integers(1, max_segment + 1)))
+        r = min(n, q + int(rng.integers(1, max_segment + 1)))
+        route = state["route"]
+        cut = [route[x] for x in {p - 1, p, q - 1, q, r - 1} | ({r} if r < n else set())]
+        route[p:r] = route[q:r] + route[p:q]
+        reindex()
+        finished = descend(deque(cut))
+        if not finished or state["forward"][-1] >= best_length - MIN_IMPROVEMENT:
+            state["route"], state["moves"] = best_route, best_moves
+            reindex()
+    return state["route"], state["moves"]
+
+
+def solve_decomposed(distance_matrix, time_matrix, location_names, coordinates, start_index=0,
+                     cluster_size=DECOMPOSE_CLUSTER_SIZE, max_workers=None, time_limit_seconds=None,
+                     global_pass_seconds=None, deadline=None):
+    """
+    Cluster-and-stitch open TSP for thousands of stops.
+
+    Stops are split into geographic clusters of about cluster_size (k-means on
+    coordinates, one (lat, lon) pair per location), the clusters are ordered
+    by an open tour over the closest-pair road distance between them, and
+    consecutive clusters are joined at their closest pair of boundary stops.
+    Each cluster's path between its
+    entry and exit stop is solved in a process pool (time_limit_seconds per
+    cluster, default = adaptive), then SEAM_WINDOW stops either side of every
+    join are re-solved exactly. A final global pass (_improve_globally) runs
+    neighbour-list 2-opt and Or-opt over the whole stitched route for
+    global_pass_seconds (default GLOBAL_PASS_SECONDS_PER_STOP x N, capped at
+    MAX_TIME_LIMIT_SECONDS), catching moves that span clusters or seams.
+    If a deadline (Unix time) is given, the cluster budgets and the global
+    pass are shrunk so the whole solve finishes before it.
+
+    Returns the usual result fields plus 'clusters' and per-phase 'timings'.
+    """
+    started = time.perf_counter()
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    time_matrix = np.asarray(time_matrix, dtype=float)
+    n = len(distance_matrix)
+    timings = {}
+
+    num_clusters = max(1, min(n, int(np.ceil(n / cluster_size))))
+    labels, _ = cluster_stops(coordinates, num_clusters)
+    clusters = [members for members in (np.flatnonzero(labels == c) for c in range(num_clusters)) if len(members)]
+    start_cluster = next(c for c, members in enumerate(clusters) if start_index in members)
+    # Order clusters on the road matrix itself (metres, like every other solve):
+    # the cost between two clusters is their closest pair of stops
+    grouped = np.concatenate(clusters)
+    offsets = np.cumsum([0] + [len(members) for members in clusters[:-1]])
+    cluster_distance = np.array([
+        np.minimum.reduceat(distance_matrix[np.ix_(members, grouped)], offsets, axis=1).min(axis=0)
+        for members in clusters])
+    cluster_order = solve_open_tsp(cluster_distance, cluster_distance, list(range(len(clusters))),
+                                   start_cluster, time_limit_seconds=2)["route"]
+    timings["partition_seconds"] = time.perf_counter() - started
+
+    workers = max(1, min(len(clusters), max_workers or os.cpu_count() or 1))
+    if global_pass_seconds is None:
+        global_pass_seconds = min(GLOBAL_PASS_SECONDS_PER_STOP * n, MAX_TIME_LIMIT_SECONDS)
+    max_cluster_budget = None
+    if deadline is not None:
+        # Clusters run in waves of `workers`; give the global pass at most a fifth
+        # of what is left and split the rest over the waves
+        remaining = deadline - time.time() - DEADLINE_MARGIN_SECONDS
+        global_pass_seconds = max(0.0, min(global_pass_seconds, 0.2 * remaining))
+        waves = -(-len(clusters) // workers)
+        max_cluster_budget = max(MIN_TIME_LIMIT_SECONDS, (remaining - global_pass_seconds) / waves)
+
+    # Join consecutive clusters at their closest boundary pair; a cluster's exit
+    # must differ from its entry unless it has a single stop
+    jobs = []
+    entry = start_index
+    for position, c in enumerate(cluster_order):
+        members = clusters[c]
+        local = {node: i for i, node in enumerate(members)}
+        exit_node, next_entry = None, None
+        if position + 1 < len(cluster_order):
+            following = clusters[cluster_order[position + 1]]
+            candidates = members[members != entry] if len(members) > 1 else members
+            block = distance_matrix[np.ix_(candidates, following)]
+            a, b = np.unravel_index(np.argmin(block), block.shape)
+            exit_node, next_entry = candidates[a], following[b]
+        budget = time_limit_seconds if time_limit_seconds is not None else default_time_budget(len(members))
+        if max_cluster_budget is not None:
+            budget = min(budget, max_cluster_budget)
+        jobs.append((distance_matrix[np.ix_(members, members)], time_matrix[np.ix_(members, members)],
+                     local[entry], None if exit_node is None else local[exit_node], budget))
+        entry = next_entry
+
+    phase = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        orders = list(executor.map(_solve_path, jobs))
+    route = [int(clusters[c][i]) for c, order in zip(cluster_order, orders) for i in order]
+    timings["cluster_solve_seconds"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    boundary = 0
+    for c in cluster_order[:-1]:
+        boundary += len(clusters[c])
+        lo, hi = max(0, boundary - SEAM_WINDOW), min(n, boundary + SEAM_WINDOW)
+        window = route[lo:hi]
+        open_end = hi == n
+        sub = np.ix_(window, window)
+        order = solve_held_karp(distance_matrix[sub], time_matrix[sub], list(range(len(window))), 0,
+                                None if open_end else len(window) - 1)["route"]
+        route[lo:hi] = [window[i] for i in order]
+    timings["seam_repair_seconds"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    if deadline is not None:
+        # Earlier phases may have overrun their share
+        global_pass_seconds = min(global_pass_seconds, deadline - time.time() - DEADLINE_MARGIN_SECONDS)
+    route, global_moves = _improve_globally(distance_matrix, route, phase + max(0.0, global_pass_seconds))
+    timings["global_pass_seconds"] = time.perf_counter() - phase
+
+    legs = list(zip(route[:-1], route[1:]))
+    return {
+        "route": [location_names[i] for i in route],
+        "total_distance_km": float(sum(distance_matrix[a, b] for a, b in legs) / 1000),
+        "total_time_minutes": float(sum(time_matrix[a, b] for a, b in legs) / 60),
+        "engine": "decomposed",
+        "clusters": len(clusters),
+        "global_moves": global_moves,
+        "solve_seconds": time.perf_counter() - started,
+        "timings": timings,
+    }
+
+
+def solve_fleet(distance_matrix, time_matrix, location_names, num_vehicles, start_indices=None,
+                vehicle_capacities=None, demands=None, on_solution=None,
+                time_limit_seconds=None, deadline=None, plateau_seconds=None, plateau_gap=PLATEAU_GAP):
+    """
+    Plans open routes for a whole fleet in one OR-Tools model.
+
+    Parameters:
+    - num_vehicles (int): Number of trucks available.
+    - start_indices (list): Start depot index per vehicle (default = 0 for all).
+    - vehicle_capacities (list): Capacity per vehicle; omit for uncapacitated trucks.
+    - demands (list): Load per location (default = 1 per stop, 0 at start depots).
+    Every vehicle ends at the shared dummy node, i.e. wherever its last stop is.
+    The remaining arguments are as for solve_open_tsp.
+
+    Returns:
+    - dict: 'routes' (one entry per vehicle, unused trucks included with a
+      single-stop route), fleet totals and the usual search details.
+    """
+    num_locations = len(distance_matrix)
+    start_indices = list(start_indices) if start_indices is not None else [0] * num_vehicles
+    if len(start_indices) != num_vehicles:
+        raise ValueError("start_indices must have one entry per vehicle.")
+
+    extended_distance, extended_time = _extend_matrices(distance_matrix, time_matrix)
+    manager, routing = _build_model(extended_distance, extended_time, start_indices, [num_locations] * num_vehicles)
+
+    if demands is None:
+        depots = set(start_indices)
+        demands = [0 if i in depots else 1 for i in range(num_locations)]
+    if vehicle_capacities is not None:
+        demand_callback_index = routing.RegisterUnaryTransitVector([int(d) for d in demands] + [0])
+        routing.AddDimensionWithVehicleCapacity(
+            demand_callback_index, 0, [int(c) for c in vehicle_capacities], True, "Capacity")
+
+    name_index = {name: i for i, name in enumerate(location_names)}
+
+    def read_fleet(next_value):
+        routes = []
+        for vehicle in range(num_vehicles):
+            leg = _read_route(routing, manager, next_value, location_names,
+                              extended_distance, extended_time, vehicle)
+            leg["vehicle"] = vehicle
+            leg["load"] = int(sum(demands[name_index[name]] for name in leg["route"]))
+            routes.append(leg)
         return {
-            "route": route,
-            "total_distance_km": float(total_distance / 1000),
-            "total_time_minutes": float(total_time / 60)
+            "routes": routes,
+            "vehicles_used": sum(1 for leg in routes if len(leg["route"]) > 1),
+            "total_distance_km": float(sum(leg["total_distance_km"] for leg in routes)),
+            "total_time_minutes": float(sum(leg["total_time_minutes"] for leg in routes)),
         }
+
+    def report_solution():
+        on_solution(read_fleet(lambda index: routing.NextVar(index).Value()))
+
+    solution, details = _search(routing, num_locations, report_solution if on_solution else None,
+                                time_limit_seconds, deadline, plateau_seconds, plateau_gap)
+
+    if solution:
+        result = read_fleet(lambda index: solution.Value(routing.NextVar(index)))
+        result.update(details)
+        return result
     else:
-        return {"error": "No solution found"}
+        return {"error": "No solution found", **details}
+
+
+def solve_payload(input_data, on_solution=None):
+    """
+    Solves one stdin/daemon payload (see the MAIN SCRIPT INTERFACE below for
+    the keys it understands) and returns the result dict.
+    """
+    distance_matrix, time_matrix = load_matrices(input_data)
+    location_names = input_data["location_names"]
+    start_index = input_data.get("start_index", 0)
+    engine = input_data.get("engine", "auto")
+    options = {key: input_data[key] for key in SEARCH_OPTION_KEYS if key in input_data}
+
+    if "coordinates" in input_data and (
+            engine == "decompose" or (engine == "auto" and len(location_names) >= DECOMPOSE_MIN_STOPS)):
+        # Thousands of stops: cluster, solve pieces in parallel, stitch
+        result = solve_decomposed(distance_matrix, time_matrix, location_names, input_data["coordinates"],
+                                  start_index, time_limit_seconds=input_data.get("time_limit_seconds"),
+                                  deadline=input_data.get("deadline"))
+        if on_solution is not None:
+            on_solution(result)
+        return result
+    if "num_vehicles" in input_data:
+        # Fleet mode: all trucks in one model
+        return solve_fleet(
+            distance_matrix, time_matrix, location_names, input_data["num_vehicles"],
+            input_data.get("vehicle_starts"), input_data.get("vehicle_capacities"),
+            input_data.get("demands"), on_solution=on_solution, **options)
+    return solve_open_tsp(distance_matrix, time_matrix, location_names, start_index,
+                          on_solution=on_solution, engine=engine,
+                          initial_route=input_data.get("initial_route"), **options)
+
+
+def _solve_payload_safely(input_data):
+    # Runs in a daemon worker; errors travel back as {"error": ...} like on stdout
+    if input_data.get("deadline") is not None and input_data["deadline"] <= time.time():
+        # Queued behind other solves until the client gave up; don't search for nobody
+        return {"error": "Deadline passed before the solve started"}
+    try:
+        return solve_payload(input_data)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _exit_with_parent(parent_pid):
+    # Daemon workers idle on a queue and would outlive a daemon that was killed;
+    # poll the parent pid and leave as soon as it changes
+    import threading
+
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(0)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def serve(address, workers=None):
+    """
+    Daemon mode: keeps OR-Tools imported in a pool of worker processes and
+    answers length-prefixed JSON payloads (see optimizer_client) on a Unix
+    socket path or host:port until killed. Each connection may send any
+    number of requests, one at a time.
+
+    Parameters:
+    - address (str): Unix socket path or host:port to listen on.
+    - workers (int): Concurrent solves (default = OPTIMIZER_WORKERS or CPU count).
+    """
+    import socket
+    import socketserver
+    import threading
+    import multiprocessing
+    from concurrent.futures.process import BrokenProcessPool
+    from optimizer_client import parse_address, recv_frame, send_frame
+
+    workers = workers or int(os.getenv("OPTIMIZER_WORKERS", "0")) or os.cpu_count() or 1
+    # Spawned, so workers never inherit the listening socket: if the daemon dies,
+    # clients must see the connection fail rather than hang on an orphaned worker
+    context = multiprocessing.get_context("spawn")
+
+    def new_executor():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   initializer=_exit_with_parent, initargs=(os.getpid(),))
+
+    pool = {"executor": new_executor()}
+    pool_lock = threading.Lock()
+
+    def submit(input_data):
+        with pool_lock:
+            executor = pool["executor"]
+        try:
+            return executor.submit(_solve_payload_safely, input_data).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); replace the pool and report this solve as failed
+            with pool_lock:
+                if pool["executor"] is executor:
+                    pool["executor"] = new_executor()
+            return {"error": "Optimizer worker crashed"}
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    input_data = recv_frame(self.request)
+                except (OSError, ValueError):
+                    return
+                if input_data is None:
+                    return
+                send_frame(self.request, submit(input_data))
+
+    family, sockaddr = parse_address(address)
+    if family == socket.AF_INET:
+        server_class = socketserver.ThreadingTCPServer
+    else:
+        server_class = socketserver.ThreadingUnixStreamServer
+        if os.path.exists(sockaddr):
+            os.remove(sockaddr)  # stale socket left by a daemon that was killed
+    server_class.daemon_threads = True
+    server_class.allow_reuse_address = True
+    with server_class(sockaddr, Handler) as server:
+        server.serve_forever()
 
 
 # === MAIN SCRIPT INTERFACE ===
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        # python optimizer.py --serve [address]: long-lived daemon used by optimizer_client
+        from optimizer_client import OPTIMIZER_ADDRESS
+        serve(sys.argv[2] if len(sys.argv) > 2 else OPTIMIZER_ADDRESS)
+        sys.exit(0)
+
     try:
         input_data = json.load(sys.stdin)
 
-        distance_matrix = np.array(input_data["distance_matrix"])
-        time_matrix = np.array(input_data["time_matrix"])
-        location_names = input_data["location_names"]
-        start_index = input_data.get("start_index", 0)
+        if input_data.get("stream"):
+            # One JSON line per improving solution, then the final result
+            def emit(partial):
+                print(json.dumps({"event": "solution", **partial}), flush=True)
 
-        result = solve_open_tsp(distance_matrix, time_matrix, location_names, start_index)
-        print(json.dumps(result))
+            result = solve_payload(input_data, on_solution=emit)
+            print(json.dumps({"event": "done", **result}), flush=True)
+        else:
+            result = solve_payload(input_data)
+            print(json.dumps(result))
 
     except Exception as e:
         print(json.dumps({"error": str(e)}))
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import subprocess
+import metrics
+from numpy_solver import solve_in_process
+
+# Interpreter with OR-Tools installed and the optimizer script it runs
+OPTIMIZER_CMD = [os.getenv("ORTOOLS_PYTHON", "venv_ortools/Scripts/python"), "optimizer.py"]
+
+# Where the optimizer daemon listens: a Unix socket path, or host:port where
+# AF_UNIX is unavailable (older Windows Pythons)
+if hasattr(socket, "AF_UNIX"):
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "route-optimizer.sock")
+else:
+    DEFAULT_ADDRESS = "127.0.0.1:8765"
+OPTIMIZER_ADDRESS = os.getenv("OPTIMIZER_SOCKET", DEFAULT_ADDRESS)
+# Set OPTIMIZER_DAEMON=0 to spawn one optimizer.py per solve like before
+USE_DAEMON = os.getenv("OPTIMIZER_DAEMON", "1") != "0"
+# Seconds to wait for one solve, and for a freshly started daemon to accept connections
+SOLVE_TIMEOUT_SECONDS = float(os.getenv("OPTIMIZER_TIMEOUT", "120"))
+STARTUP_TIMEOUT_SECONDS = 30.0
+
+# Frames are a 4-byte big-endian length followed by that many bytes of UTF-8 JSON
+_HEADER = struct.Struct(">I")
+
+
+class OptimizerError(RuntimeError):
+    """Raised when the optimizer cannot be reached or fails to return a result."""
+
+
+def send_frame(sock, message):
+    body = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    """Reads one frame; returns None if the peer closed the connection between frames."""
+    header = sock.recv(_HEADER.size)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        header += _recv_exact(sock, _HEADER.size - len(header))
+    (size,) = _HEADER.unpack(header)
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+def parse_address(address):
+    """Returns (family, sockaddr) for a Unix socket path or a host:port string."""
+    host, _, port = address.rpartition(":")
+    if port.isdigit() and host:
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+class OptimizerClient:
+    """
+    Client for the `optimizer.py --serve` daemon. Connections are kept open and
+    reused between solves; if the daemon is not running (or has died) it is
+    started again on the next call.
+
+    Parameters:
+    - address (str): Unix socket path or host:port (default = OPTIMIZER_SOCKET).
+    - timeout (float): Seconds to wait for one solve.
+    - autostart (bool): Start the daemon when nothing is listening.
+    """
+
+    def __init__(self, address=None, timeout=SOLVE_TIMEOUT_SECONDS, autostart=True):
+        self.address = address or OPTIMIZER_ADDRESS
+        self.family, self.sockaddr = parse_address(self.address)
+        self.timeout = timeout
+        self.autostart = autostart
+        self._idle = queue.LifoQueue()
+        self._start_lock = threading.Lock()
+        self._daemon = None
+
+    def _connect(self):
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.sockaddr)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _start_daemon(self):
+        # Only one thread (re)starts the daemon; the rest wait for it to accept connections
+        with self._start_lock:
+            try:
+                return self._connect()
+            except OSError:
+                pass
+            if not self.autostart:
+                raise OptimizerError(f"No optimizer daemon listening on {self.address}")
+            if self._daemon is not None:
+                # The daemon we started earlier died or stopped answering
+                metrics.inc("route_subprocess_failures_total", kind="optimizer_daemon")
+                if self._daemon.poll() is None:
+                    self._daemon.kill()
+            self._daemon = subprocess.Popen(OPTIMIZER_CMD + ["--serve", self.address],
+                                            stdin=subprocess.DEVNULL)
+            deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+            while time.monotonic() < deadline:
+                if self._daemon.poll() is not None:
+                    raise OptimizerError(f"Optimizer daemon exited with code {self._daemon.returncode}")
+                try:
+                    return self._connect()
+                except OSError:
+                    time.sleep(0.1)
+            raise OptimizerError(f"Optimizer daemon did not start within {STARTUP_TIMEOUT_SECONDS}s")
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            pass
+        try:
+            return self._connect(), False
+        except OSError:
+            return self._start_daemon(), False
+
+    def solve(self, payload):
+        """
+        Sends one optimizer payload to the daemon and returns its result dict.
+
+        The payload carries the time this client stops waiting as its
+        'deadline' (or the caller's own, if earlier), so the daemon ends the
+        search and frees its worker instead of solving for nobody.
+        """
+        give_up_at = time.time() + self.timeout
+        payload = {**payload, "deadline": min(payload.get("deadline") or give_up_at, give_up_at)}
+        for attempt in range(2):
+            sock, reused = self._checkout()
+            sock.settimeout(self.timeout)
+            try:
+                send_frame(sock, payload)
+                result = recv_frame(sock)
+                if result is None:
+                    raise ConnectionError("Optimizer daemon closed the connection")
+            except socket.timeout:
+                sock.close()
+                raise OptimizerError(f"Optimizer timed out after {self.timeout}s")
+            except OSError as e:
+                sock.close()
+                # A pooled connection may have gone stale if the daemon restarted; retry once on a fresh one
+                if attempt == 0 and reused:
+                    continue
+                metrics.inc("route_subprocess_failures_total", kind="optimizer_daemon")
+                raise OptimizerError(f"Optimizer daemon connection failed: {e!r}")
+            self._idle.put(sock)
+            return result
+        raise OptimizerError("Optimizer daemon connection failed")
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _run_subprocess(payload):
+    process = subprocess.Popen(
+        OPTIMIZER_CMD,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    stdout, stderr = process.communicate(input=json.dumps(payload))
+    if process.returncode != 0:
+        metrics.inc("route_subprocess_failures_total", kind="optimizer")
+        raise OptimizerError(f"Error: {stderr}")
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        metrics.inc("route_subprocess_failures_total", kind="optimizer")
+        raise OptimizerError(f"Optimizer returned no result: {stderr}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the process-wide OptimizerClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OptimizerClient()
+        return _client
+
+
+def run_ortools_backend(input_payload: dict):
+    """
+    Solves one optimizer payload and returns the result optimizer.py produces.
+
+    Small routes are solved in-process (see numpy_solver.solve_in_process);
+    the rest go to the long-lived optimizer daemon, or to a one-off
+    optimizer.py subprocess when OPTIMIZER_DAEMON=0.
+    """
+    with metrics.timed("optimizer_solve"):
+        result = solve_in_process(input_payload)
+        if result is None:
+            result = get_client().solve(input_payload) if USE_DAEMON else _run_subprocess(input_payload)
+    metrics.count_solver_result(result)
+    return result
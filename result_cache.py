@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def location_table_version(path):
+    """
+    Cheap version tag for the location table: changes whenever the file is
+    rewritten, without having to parse it.
+    """
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def cache_key(location_names, start_index=0, solver_params=None, table_version="", kind="result"):
+    """
+    Content-addressed key for a routing result.
+
+    Parameters:
+    - location_names (list): Ordered stop list as sent by the caller.
+    - start_index (int): Index of the fixed start location.
+    - solver_params (dict): Anything that changes the solver's output.
+    - table_version (str): Version of the location table (see location_table_version).
+    - kind (str): What is stored under the key (e.g. "map_html"), so callers that
+      cache different values for the same stops never read each other's entries
+      when they share a RESULT_CACHE_DIR.
+
+    Returns:
+    - str: Hex SHA-256 digest, also usable as an HTTP ETag.
+    """
+    material = json.dumps(
+        [kind, list(location_names), int(start_index), solver_params or {}, table_version],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and optional on-disk persistence.
+
+    Parameters:
+    - max_entries (int): Entries kept in memory before the least recently used is evicted.
+    - ttl_seconds (float): Lifetime of an entry; None keeps entries until evicted.
+    - directory (str): If set, entries are also pickled here and survive restarts.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, directory=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _expired(self, stored_at):
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self._expired(stored_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return default
+            self._remember(key, entry)
+            self.hits += 1
+            return entry[1]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def set(self, key, value):
+        entry = (time.time(), value)
+        with self._lock:
+            self._remember(key, entry)
+        if self.directory:
+            tmp_path = self._disk_path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f)
+            os.replace(tmp_path, self._disk_path(key))
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if self._expired(entry[0]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, name))
+
+
+_MISSING = object()
+
+
+def cache_from_env(prefix="RESULT_CACHE", default_size=256):
+    """Builds a ResultCache from <prefix>_SIZE, <prefix>_TTL and <prefix>_DIR environment variables."""
+    ttl = os.getenv(f"{prefix}_TTL", "3600")
+    return ResultCache(
+        max_entries=int(os.getenv(f"{prefix}_SIZE", str(default_size))),
+        ttl_seconds=float(ttl) if float(ttl) > 0 else None,
+        directory=os.getenv(f"{prefix}_DIR") or None,
+    )
@@ -1,30 +1,15 @@
 import sys
 import os
-import subprocess
-import json
 import numpy as np
-from routing import plot_routes_from_names, calculate_random_route, get_distance_and_duration_matrices, calculate_trip_cost
+from routing import plot_routes_from_names, calculate_random_route, get_distance_and_duration_matrices, calculate_trip_cost, get_location_coordinates, matrices_estimated
 from dotenv import load_dotenv
 import pandas as pd
-
-def run_ortools_backend(input_payload: dict):
-    process = subprocess.Popen(
-        ["venv_ortools/Scripts/python", "utils/optimizer.py"],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    input_json = json.dumps(input_payload)
-    stdout, stderr = process.communicate(input=input_json)
-
-    if process.returncode != 0:
-        raise RuntimeError(f"Error: {stderr}")
-
-    return json.loads(stdout)
+from optimizer_client import run_ortools_backend
+from matrix_transport import matrix_payload
+from locations import LOCATIONS_PATH, load_locations
 
 def get_route_data():
-    return pd.read_excel(r'data/locations.xlsx')
+    return load_locations(LOCATIONS_PATH)
 
 # Example backend function for route optimization
 # This can be called from a frontend or API endpoint
@@ -33,22 +18,19 @@ def optimize_route(location_names, df, api_key):
     dist_matrix, dur_matrix = get_distance_and_duration_matrices(
         location_names, df, api_key)
 
-    if isinstance(dist_matrix, np.ndarray):
-        dist_matrix = dist_matrix.tolist()
-    if isinstance(dur_matrix, np.ndarray):
-        dur_matrix = dur_matrix.tolist()
-
     payload = {
-        "distance_matrix": dist_matrix,
-        "time_matrix": dur_matrix,
         "location_names": location_names,
         "start_index": location_names.index(location_names[0]),
+        "coordinates": get_location_coordinates(location_names, df),
     }
-    result = run_ortools_backend(payload)
+    with matrix_payload(payload, dist_matrix, dur_matrix) as payload:
+        result = run_ortools_backend(payload)
     route = result["route"]
     cost = calculate_trip_cost(result["total_distance_km"])
     return {
         "route": route,
         "cost": cost,
-        "raw_result": result
+        "raw_result": result,
+        # Some pairs estimated offline while the Distance Matrix API was down
+        "matrix_estimated": matrices_estimated(dist_matrix, dur_matrix),
     }
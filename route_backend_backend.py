@@ -2,60 +2,211 @@ import sys
 import pandas as pd
 import os
 import numpy as np
-import subprocess
 import json
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from dotenv import load_dotenv
-from routing import plot_routes_from_names, calculate_random_route, get_distance_and_duration_matrices, calculate_trip_cost
-
-def run_ortools_backend(input_payload: dict):
-    process = subprocess.Popen(
-        ["venv_ortools/Scripts/python", "optimizer.py"],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    input_json = json.dumps(input_payload)
-    stdout, stderr = process.communicate(input=input_json)
+import metrics
+import solver_settings
+from numpy_solver import (EXACT_MAX_STOPS, IN_PROCESS_MAX_STOPS, LOCAL_SEARCH_TIME_LIMIT_SECONDS, KICK_SECONDS_PER_STOP,
+                          PLATEAU_KICKS, OR_OPT_MAX_SEGMENT, in_process_engine, solve_in_process)
+from optimizer_client import run_ortools_backend
+from matrix_transport import matrix_payload
+from locations import LOCATIONS_PATH, load_location_registry, as_location_registry
+from routing import plot_routes_from_names, route_geometry, random_route_baseline, get_distance_and_duration_matrices, calculate_trip_cost, update_distance_and_duration_matrices, get_location_coordinates, get_batch_distance_and_duration_matrices, matrices_estimated
+
+# Process pool for CPU-bound in-process solves in optimize_batch, created on first use.
+# Spawned (not forked) so workers never inherit Flask's threads or sockets.
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
 
-    if process.returncode != 0:
-        raise RuntimeError(f"Error: {stderr}")
+def _get_batch_pool():
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ProcessPoolExecutor(max_workers=int(os.getenv("BATCH_WORKERS", "0")) or os.cpu_count(),
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return _batch_pool
 
-    return json.loads(stdout)
+def _discard_batch_pool(pool):
+    # A worker died (e.g. killed for memory) and broke the pool; the next batch gets a fresh one
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    pool.shutdown(wait=False)
+
+def _timed_solve_in_process(payload):
+    # Runs in a batch pool worker; the solve time goes back to the parent's
+    # optimizer_solve stage, since metrics recorded in the worker are lost
+    started = time.perf_counter()
+    result = solve_in_process(payload)
+    return result, time.perf_counter() - started
 
 # Example backend function for route optimization
 def optimize_route(location_names, df, api_key):
+    """
+    Returns (route, cost, matrix_estimated); matrix_estimated is True when the
+    Distance Matrix API was down and some pairs were estimated offline, in
+    which case the plan should not be cached.
+    """
     dist_matrix, dur_matrix = get_distance_and_duration_matrices(location_names, df, api_key)
-    if isinstance(dist_matrix, np.ndarray):
-        dist_matrix = dist_matrix.tolist()
-    if isinstance(dur_matrix, np.ndarray):
-        dur_matrix = dur_matrix.tolist()
     payload = {
-        "distance_matrix": dist_matrix,
-        "time_matrix": dur_matrix,
         "location_names": location_names,
         "start_index": location_names.index(location_names[0]),
+        "coordinates": get_location_coordinates(location_names, df),
     }
-    # result = run_ortools_backend(payload)
-    result=json.loads(subprocess.run(
-    ["venv_ortools\\Scripts\\python.exe", "optimizer.py"],
-    input=json.dumps(payload).encode(),
-    stdout=subprocess.PIPE,
-    stderr=subprocess.PIPE,).stdout.decode("utf-8", errors="ignore"))
+    with matrix_payload(payload, dist_matrix, dur_matrix) as payload:
+        result = run_ortools_backend(payload)
     route = result["route"]
     cost = calculate_trip_cost(result["total_distance_km"])
-    return route, cost
+    return route, cost, matrices_estimated(dist_matrix, dur_matrix)
+
+# Incremental re-optimization after a dispatcher adds or drops stops
+def reoptimize_route(location_names, df, api_key, previous):
+    """
+    Re-plans a route from a previous plan: only matrix rows/columns for new
+    stops are fetched and the optimizer warm-starts from the previous route.
+
+    previous is the plan dict returned by an earlier call:
+    {'location_names', 'dist_matrix', 'dur_matrix', 'route'}.
+    Returns (route, cost, plan), where plan can be passed back in next time.
+    """
+    dist_matrix, dur_matrix = update_distance_and_duration_matrices(
+        previous["location_names"], previous["dist_matrix"], previous["dur_matrix"],
+        location_names, df, api_key)
+    payload = {
+        "location_names": location_names,
+        "start_index": 0,
+        "initial_route": previous["route"],
+        "coordinates": get_location_coordinates(location_names, df),
+    }
+    with matrix_payload(payload, dist_matrix, dur_matrix) as payload:
+        result = run_ortools_backend(payload)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    plan = {
+        "location_names": location_names,
+        "dist_matrix": dist_matrix,
+        "dur_matrix": dur_matrix,
+        "route": result["route"],
+        "matrix_estimated": matrices_estimated(dist_matrix, dur_matrix),
+    }
+    return result["route"], calculate_trip_cost(result["total_distance_km"]), plan
+
+def optimize_batch(stop_sets, df, api_key, max_workers=None):
+    """
+    Plans many routes in one go and yields per-route results as they finish.
+
+    Only the stop pairs some route needs are fetched, each once (see
+    routing.get_batch_distance_and_duration_matrices), and identical stop lists
+    are solved once. Routes small enough for
+    the NumPy engines run in a shared process pool (BATCH_WORKERS, default = CPU
+    count); larger ones go to the optimizer daemon from up to max_workers
+    threads (default = CPU count).
+
+    A route with an unknown stop or fewer than two stops gets an error of its
+    own and is left out of the fetch; the other routes are planned as usual.
+
+    Yields:
+    - dict: {'index', 'route', 'cost', 'raw_result'} or {'index', 'error'}
+    """
+    # Routes that can't be planned get their own error and stay out of the shared fetch
+    registry = as_location_registry(df)
+    valid = []
+    for index, stops in enumerate(stop_sets):
+        unknown = [name for name in stops if name not in registry]
+        if len(stops) < 2:
+            yield {"index": index, "error": "Need at least two locations per route"}
+        elif unknown:
+            yield {"index": index, "error": f"Location '{unknown[0]}' not found in location table."}
+        else:
+            valid.append(index)
+    if not valid:
+        return
+
+    try:
+        unique_names, dist_matrix, dur_matrix = get_batch_distance_and_duration_matrices(
+            [stop_sets[index] for index in valid], df, api_key)
+    except Exception as e:
+        for index in valid:
+            yield {"index": index, "error": f"Matrix lookup failed: {e}"}
+        return
+    positions = {name: i for i, name in enumerate(unique_names)}
+
+    # Requests for the same ordered stop list share one solve
+    requests_by_stops = {}
+    for index in valid:
+        requests_by_stops.setdefault(tuple(stop_sets[index]), []).append(index)
+
+    def solve_remote(payload, dist, dur):
+        with matrix_payload(payload, dist, dur) as payload:
+            return run_ortools_backend(payload)
+
+    # Small routes are NumPy solves that would serialize on this process's GIL,
+    # so they go to the batch process pool; the rest wait on the optimizer daemon
+    # from threads, since the daemon runs them in its own processes
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures, local = {}, set()
+        for stops, indices in requests_by_stops.items():
+            idx = [positions[name] for name in stops]
+            payload = {"location_names": list(stops), "start_index": 0}
+            dist, dur = dist_matrix[np.ix_(idx, idx)], dur_matrix[np.ix_(idx, idx)]
+            if in_process_engine(payload):
+                pool = _get_batch_pool()
+                future = pool.submit(
+                    _timed_solve_in_process, {**payload, "distance_matrix": dist, "time_matrix": dur})
+                local.add(future)
+            else:
+                future = executor.submit(solve_remote, payload, dist, dur)
+            futures[future] = indices
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                if future in local:
+                    # run_ortools_backend times and counts the daemon's results itself
+                    result, seconds = result
+                    metrics.observe("optimizer_solve", seconds)
+                    metrics.count_solver_result(result)
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+                outcome = {
+                    "route": result["route"],
+                    "cost": calculate_trip_cost(result["total_distance_km"]),
+                    "raw_result": result,
+                }
+            except BrokenProcessPool as e:
+                _discard_batch_pool(pool)
+                outcome = {"error": f"Batch worker crashed: {e}"}
+            except Exception as e:
+                outcome = {"error": str(e)}
+            for index in futures[future]:
+                yield {"index": index, **outcome}
 
 # Example backend function for non-optimized route
-def get_non_optimized_route(location_names, dist_matrix, dur_matrix):
-    non_opt_result = calculate_random_route(
+def get_non_optimized_route(location_names, dist_matrix, dur_matrix, optimized_distance_km=None):
+    """
+    Reference "non-optimized" route from the random-order baseline
+    (routing.random_route_baseline): the order at the median distance of
+    thousands of seeded random orders, so repeated calls agree.
+
+    Returns:
+    - (route, worst_cost, baseline): the median order, its trip cost, and the
+      full baseline dict (distribution, and savings when optimized_distance_km is given)
+    """
+    baseline = random_route_baseline(
         location_names,
         dist_matrix,
         dur_matrix,
         location_names.index(location_names[0]),
+        optimized_distance_km=optimized_distance_km,
     )
-    worst_cost = calculate_trip_cost(non_opt_result["total_distance_km"])
-    return non_opt_result["route"], worst_cost
+    worst_cost = calculate_trip_cost(baseline["total_distance_km"])
+    return baseline["route"], worst_cost, baseline
 
 # Backend function to generate a map HTML for a given route (like in sheet3.py)
 def get_route_map_html(route, df, api_key):
@@ -63,7 +214,70 @@ def get_route_map_html(route, df, api_key):
     Returns the HTML representation of the route map using plot_routes_from_names.
     """
     map_obj = plot_routes_from_names(route, df, api_key)
-    return map_obj._repr_html_()
+    with metrics.timed("html_serialization"):
+        return map_obj._repr_html_()
+
+def get_route_json(route, df, api_key, output="json", simplify_zoom=None, alternatives=None):
+    """
+    Returns the route as compact JSON or GeoJSON for the frontend's own map
+    components (see routing.route_geometry); folium is not involved.
+    """
+    return route_geometry(route, df, api_key, simplify_zoom, alternatives, output)
+
+
+
+# Solver settings the routes come from; part of every result cache key, so
+# changing any threshold here or in solver_settings starts fresh cache entries
+SOLVER_PARAMS = {
+    "engine": "auto",
+    "exact_max_stops": EXACT_MAX_STOPS,
+    "in_process_max_stops": IN_PROCESS_MAX_STOPS,
+    "local_search": {
+        "time_limit_seconds": LOCAL_SEARCH_TIME_LIMIT_SECONDS,
+        "kick_seconds_per_stop": KICK_SECONDS_PER_STOP,
+        "plateau_kicks": PLATEAU_KICKS,
+        "or_opt_max_segment": OR_OPT_MAX_SEGMENT,
+    },
+    "ortools": {name.lower(): value for name, value in vars(solver_settings).items() if name.isupper()},
+}
+
+# Returned in place of the map when anything in the pipeline fails
+DUMMY_MAP_HTML = '''
+        <div style="width:100%;height:320px;display:flex;align-items:center;justify-content:center;background:#eee;border-radius:10px;">
+            <span style="color:#888;font-size:1.2rem;">Dummy Map Preview (Backend Error)</span>
+        </div>
+        '''
+
+
+def handle_map_request(input_data, df, api_key):
+    """
+    Handles one /api/get-map-html payload against an already loaded location table.
+    Used both by the stdin entry point below and by the warm workers in worker_pool.py.
+
+    Returns {'html', 'matrix_estimated'} (see optimize_route).
+    """
+    route = input_data.get('route', [])
+    try:
+        # Call optimize_route with the route as location_names
+        optimized_route, cost, matrix_estimated = optimize_route(route, df, api_key)
+        return {"html": get_route_map_html(optimized_route, df, api_key), "matrix_estimated": matrix_estimated}
+    except Exception:
+        # Return a dummy map HTML if any error occurs
+        return {"html": DUMMY_MAP_HTML, "matrix_estimated": False}
+
+def handle_route_request(input_data, df, api_key):
+    """
+    Handles one /api/get-route payload: optimizes the stops like
+    handle_map_request, then returns get_route_json for the optimized order
+    with the trip cost and 'matrix_estimated' added. Errors propagate to the caller.
+    """
+    route = input_data.get('route', [])
+    optimized_route, cost, matrix_estimated = optimize_route(route, df, api_key)
+    result = get_route_json(optimized_route, df, api_key, input_data.get('format') or 'json',
+                            input_data.get('simplify_zoom'), input_data.get('alternatives'))
+    result["cost"] = cost
+    result["matrix_estimated"] = matrix_estimated
+    return result
 
 
 if __name__ == "__main__":
@@ -71,27 +285,8 @@ if __name__ == "__main__":
         load_dotenv()
         # Read JSON input from stdin (from Flask server)
         input_data = json.load(sys.stdin)
-        route = input_data.get('route', [])
-        # You can use start_location if needed, or just use route[0] as start
-        df = pd.read_excel('data/locations.xlsx')
-        # api_key = os.getenv('API_KEY')
-        # # Call optimize_route with the route as location_names
-        # optimized_route, cost = optimize_route(route, df, api_key)
-        # # Optionally, return the map HTML
-        # html = get_route_map_html(optimized_route, df, api_key)
-        # print(html)
-                # Return a dummy map HTML if any error occurs
-        dummy_html = '''
-        <div style="width:100%;height:320px;display:flex;align-items:center;justify-content:center;background:#eee;border-radius:10px;">
-            <span style="color:#888;font-size:1.2rem;">Dummy Map Preview (Backend Error)</span>
-        </div>
-        '''
-        print(dummy_html)
+        df = load_location_registry(LOCATIONS_PATH)
+        api_key = os.getenv('API_KEY')
+        print(handle_map_request(input_data, df, api_key)["html"])
     except Exception as e:
-        # Return a dummy map HTML if any error occurs
-        dummy_html = '''
-        <div style="width:100%;height:320px;display:flex;align-items:center;justify-content:center;background:#eee;border-radius:10px;">
-            <span style="color:#888;font-size:1.2rem;">Dummy Map Preview (Backend Error)</span>
-        </div>
-        '''
-        print(dummy_html)
\ No newline at end of file
+        print(DUMMY_MAP_HTML)
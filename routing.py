@@ -1,12 +1,149 @@
 import requests
 import random
 import folium
-import polyline
 import pandas as pd
 import numpy as np
 #from dotenv import load_dotenv
 import os
+import math
+import time
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+import metrics
+from result_cache import cache_from_env, cache_key
+from travel_cache import get_travel_cache, departure_bucket, coord_key
+from locations import as_location_registry
+from geometry import decode_polyline, encode_polyline, simplify_for_zoom
 
+# Distance Matrix API limits per request
+MAX_MATRIX_ORIGINS = 25
+MAX_MATRIX_DESTINATIONS = 25
+MAX_MATRIX_ELEMENTS = 100
+
+# Endpoint (point it at a local stub server for tests and benchmarks)
+DISTANCE_MATRIX_URL = os.getenv("DISTANCE_MATRIX_URL", "https://maps.googleapis.com/maps/api/distancematrix/json")
+# Tiles fetched at once, and the element rate kept under (Google allows 1000 elements/s; 0 = no limit)
+MATRIX_FETCH_WORKERS = int(os.getenv("MATRIX_FETCH_WORKERS", "8"))
+MATRIX_ELEMENTS_PER_SECOND = float(os.getenv("MATRIX_ELEMENTS_PER_SECOND", "1000"))
+# Attempts per tile on network errors, 5xx/429 and OVER_QUERY_LIMIT, with exponential backoff
+MATRIX_MAX_ATTEMPTS = int(os.getenv("MATRIX_MAX_ATTEMPTS", "4"))
+MATRIX_BACKOFF_SECONDS = 0.5
+MATRIX_REQUEST_TIMEOUT_SECONDS = 30
+
+# Top-level API statuses worth retrying; anything else but OK fails the tile at once
+_RETRYABLE_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+# Offline estimator: road distance = CIRCUITY x great-circle distance, duration =
+# OVERHEAD + road distance / SPEED. These defaults hold until MIN_CALIBRATION_PAIRS
+# API results are in the travel-time cache to fit them from; refitted hourly
+DEFAULT_CIRCUITY = 1.4
+DEFAULT_SPEED_MPS = 5.5  # ~20 km/h in city traffic
+DEFAULT_OVERHEAD_SECONDS = 60.0
+MIN_CALIBRATION_PAIRS = 50
+ESTIMATOR_REFIT_SECONDS = 3600
+EARTH_RADIUS_M = 6371008.8
+# "estimate" fills pairs the API could not deliver because of an outage (network
+# errors, timeouts, 5xx/429, OVER_QUERY_LIMIT after retries) from the estimator
+# instead of failing; "none" raises like before. Errors the request itself causes
+# (REQUEST_DENIED, INVALID_REQUEST, other 4xx) always raise
+MATRIX_FALLBACK = os.getenv("MATRIX_FALLBACK", "estimate")
+
+# Routes API endpoint and how many legs of a route are fetched at once
+ROUTES_API_URL = os.getenv("ROUTES_API_URL", "https://routes.googleapis.com/directions/v2:computeRoutes")
+LEG_FETCH_WORKERS = int(os.getenv("LEG_FETCH_WORKERS", "8"))
+ROUTES_REQUEST_TIMEOUT_SECONDS = 30
+
+# Route map lines are simplified to within one pixel at MAP_SIMPLIFY_ZOOM (0 = full
+# resolution), coarsened down to MAP_MIN_SIMPLIFY_ZOOM until at most MAP_MAX_POINTS remain.
+# MAP_ALTERNATIVES: "all" alternative routes per leg, "thin" (one, coarser) or "none"
+MAP_SIMPLIFY_ZOOM = int(os.getenv("MAP_SIMPLIFY_ZOOM", "16"))
+MAP_MIN_SIMPLIFY_ZOOM = 8
+MAP_MAX_POINTS = int(os.getenv("MAP_MAX_POINTS", "20000"))
+MAP_ALTERNATIVE_MODES = ("all", "thin", "none")
+MAP_ALTERNATIVES = os.getenv("MAP_ALTERNATIVES", "all")
+
+# Random-route baseline: permutations sampled per route, with a fixed seed so the
+# same stops always give the same figures; all (n-1)! orders are used instead when
+# there are no more of them than samples. Sampled in chunks of at most
+# BASELINE_CHUNK_ELEMENTS route positions to bound memory on long routes
+BASELINE_SAMPLES = int(os.getenv("BASELINE_SAMPLES", "5000"))
+BASELINE_SEED = int(os.getenv("BASELINE_SEED", "0"))
+BASELINE_PERCENTILES = (5, 25, 50, 75, 95)
+BASELINE_CHUNK_ELEMENTS = 4_000_000
+
+logger = logging.getLogger(__name__)
+
+
+class DistanceMatrixError(RuntimeError):
+    """
+    Raised when the Distance Matrix API rejects a request or keeps failing;
+    retryable is True for outages (as opposed to a bad key or request).
+    """
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class EstimatedMatrix(np.ndarray):
+    """
+    Matrix type returned when some pairs were estimated offline (see
+    MATRIX_FALLBACK). Slices and arithmetic keep the type; results built from
+    such a matrix should not be cached, so the real values are used once the
+    API is back. Check with matrices_estimated().
+    """
+
+
+def matrices_estimated(*matrices):
+    """True if any of the matrices contains offline-estimated pairs."""
+    return any(isinstance(matrix, EstimatedMatrix) for matrix in matrices)
+
+
+class _RateLimiter:
+    """Spaces out requests so that at most `rate` units (elements) start per second, across threads."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_start = time.monotonic()
+
+    def acquire(self, amount=1):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + amount / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+_matrix_rate_limiter = _RateLimiter(MATRIX_ELEMENTS_PER_SECOND)
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the process-wide requests.Session used for Google Maps calls, so
+    connections are kept alive and reused; its pool fits MATRIX_FETCH_WORKERS.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(MATRIX_FETCH_WORKERS, 10))
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+# Decoded leg geometries by origin/destination coordinates (LEG_CACHE_SIZE, _TTL, _DIR),
+# shared by every route that uses the same leg
+_leg_cache = cache_from_env("LEG_CACHE", default_size=4096)
 
 def get_random_color(exclude_colors=None):
     exclude_colors = exclude_colors or set()
@@ -15,7 +152,7 @@ def get_random_color(exclude_colors=None):
         if color not in exclude_colors:
             return color
 
-def build_payload(origin, destination):
+def build_payload(origin, destination, alternatives=True):
     return {
         "origin": {
             "location": {
@@ -35,33 +172,130 @@ def build_payload(origin, destination):
         },
         "travelMode": "DRIVE",
         "routingPreference": "TRAFFIC_AWARE_OPTIMAL",
-        "computeAlternativeRoutes": True
+        "computeAlternativeRoutes": alternatives
     }
 
 def get_routes(payload, api_key):
-    url = 'https://routes.googleapis.com/directions/v2:computeRoutes'
     headers = {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": api_key,
         "X-Goog-FieldMask": "routes.duration,routes.distanceMeters,routes.polyline.encodedPolyline"
     }
-    response = requests.post(url, headers=headers, json=payload)
+    metrics.inc("route_upstream_api_calls_total", api="routes")
+    with metrics.timed("routes_api"):
+        response = get_session().post(ROUTES_API_URL, headers=headers, json=payload,
+                                      timeout=ROUTES_REQUEST_TIMEOUT_SECONDS)
     response.raise_for_status()
     return response.json()
 
-def plot_routes_from_names(location_order, df, api_key):
+def get_leg_routes(origin, destination, api_key, alternatives=True):
+    """
+    Returns the routes for one leg, best first, as
+    [{'coords': (n, 2) array of [lat, lng], 'polyline': encoded string,
+      'distance_km', 'duration_min'}, ...].
+
+    Decoded results are kept in the leg cache, so re-rendering a route, or
+    another route through the same leg, makes no new Routes API call.
+    """
+    key = cache_key([coord_key(*origin), coord_key(*destination)],
+                    solver_params={"alternatives": alternatives}, kind="route_leg")
+    routes = _leg_cache.get(key)
+    if routes is not None:
+        metrics.inc("route_cache_hits_total", cache="route_leg")
+        return routes
+    metrics.inc("route_cache_misses_total", cache="route_leg")
+
+    route_data = get_routes(build_payload(origin, destination, alternatives), api_key)
+    routes = [{
+        "coords": decode_polyline(route['polyline']['encodedPolyline']),
+        "polyline": route['polyline']['encodedPolyline'],
+        "distance_km": route['distanceMeters'] / 1000,
+        "duration_min": int(route['duration'].replace('s', '')) / 60,
+    } for route in route_data.get('routes', [])]
+    _leg_cache.set(key, routes)
+    return routes
+
+def fetch_route_legs(locations, api_key, alternatives=True):
+    """
+    Returns {(origin, destination): get_leg_routes(...)} for consecutive
+    locations ((lat, lng) tuples), fetching the distinct legs concurrently
+    over the shared session.
+    """
+    legs = list(dict.fromkeys(zip(locations, locations[1:])))
+    with metrics.timed("route_legs"):
+        with ThreadPoolExecutor(max_workers=max(1, min(LEG_FETCH_WORKERS, len(legs)))) as executor:
+            return dict(zip(legs, executor.map(lambda leg: get_leg_routes(*leg, api_key, alternatives), legs)))
+
+def _map_alternatives(alternatives):
+    # Resolves the default and rejects unknown modes instead of drawing them as "all"
+    alternatives = alternatives or MAP_ALTERNATIVES
+    if alternatives not in MAP_ALTERNATIVE_MODES:
+        raise ValueError(f"Unsupported alternatives '{alternatives}'. Choose from: 'all', 'thin', 'none'.")
+    return alternatives
+
+def select_map_geometry(leg_routes, simplify_zoom=None, alternatives=None, max_points=None):
+    """
+    Picks and simplifies the geometry to draw for each leg.
+
+    Returns {leg: [(route, coords), ...]} with the best route first. Routes
+    are simplified with Douglas-Peucker to within one pixel at simplify_zoom
+    (0 = full resolution); if all legs together still exceed max_points, the
+    zoom is lowered a level at a time (doubling the tolerance) until they fit.
+    With alternatives="thin" at most one alternative per leg is kept, two zoom
+    levels coarser; with "none" only the best route is drawn. Any other
+    alternatives value raises ValueError.
+    """
+    simplify_zoom = MAP_SIMPLIFY_ZOOM if simplify_zoom is None else simplify_zoom
+    alternatives = _map_alternatives(alternatives)
+    max_points = MAP_MAX_POINTS if max_points is None else max_points
+
+    def pick(zoom):
+        selected = {}
+        for leg, routes in leg_routes.items():
+            if alternatives == "none":
+                routes = routes[:1]
+            elif alternatives == "thin":
+                routes = routes[:2]
+            selected[leg] = []
+            for idx, route in enumerate(routes):
+                coords = np.asarray(route["coords"], dtype=float)
+                if zoom:
+                    coords = simplify_for_zoom(coords, max(zoom - 2, 1) if idx and alternatives == "thin" else zoom)
+                selected[leg].append((route, coords))
+        return selected
+
+    zoom = simplify_zoom
+    with metrics.timed("map_simplify"):
+        selected = pick(zoom)
+        while zoom and zoom > MAP_MIN_SIMPLIFY_ZOOM and max_points and \
+                sum(len(coords) for drawn in selected.values() for _, coords in drawn) > max_points:
+            zoom -= 1
+            selected = pick(zoom)
+    return selected
+
+def plot_routes_from_names(location_order, df, api_key, simplify_zoom=None, alternatives=None):
+    """
+    Builds a folium map of the route through location_order, with every leg's
+    best route (and alternatives, see select_map_geometry) drawn from the
+    Routes API.
+
+    Parameters:
+    - location_order: Location names in visiting order
+    - df: LocationRegistry or location DataFrame
+    - api_key: Google Maps API key
+    - simplify_zoom: Zoom level the lines stay accurate to (default MAP_SIMPLIFY_ZOOM, 0 = full resolution)
+    - alternatives: "all", "thin" or "none" (default MAP_ALTERNATIVES); "none" also skips requesting them
+    """
+    with metrics.timed("plot_routes"):
+        return _plot_routes_from_names(location_order, df, api_key, simplify_zoom, alternatives)
+
+def _plot_routes_from_names(location_order, df, api_key, simplify_zoom=None, alternatives=None):
+    alternatives = _map_alternatives(alternatives)
     if len(location_order) < 2:
         raise ValueError("Need at least two locations in order to plot routes.")
 
-    # Lookup lat/lng from df in order
-    locations = []
-    for name in location_order:
-        row = df[df['Name'] == name]
-        if row.empty:
-            raise ValueError(f"Location '{name}' not found in DataFrame.")
-        lat = row.iloc[0]['Latitude']
-        lon = row.iloc[0]['Longitude']
-        locations.append((lat, lon))
+    # Lookup lat/lng in order (df may be a LocationRegistry or the raw DataFrame)
+    locations = [tuple(coord) for coord in _lookup_coords(location_order, df).tolist()]
 
     m = folium.Map(location=locations[0], zoom_start=10)
     used_colors = {"#00008B"}  # dark blue for best routes
@@ -83,22 +317,16 @@ def plot_routes_from_names(location_order, df, api_key):
             icon=folium.Icon(color=icon_color, icon="info-sign")
         ).add_to(m)
 
+    # Fetch every leg at once over the shared session; repeated legs are fetched once
+    legs = list(zip(locations, locations[1:]))
+    leg_routes = fetch_route_legs(locations, api_key, alternatives != "none")
+    geometry = select_map_geometry(leg_routes, simplify_zoom, alternatives)
+
     # Draw polylines with route info
-    for i in range(len(locations) - 1):
-        origin = locations[i]
-        destination = locations[i + 1]
+    for i, leg in enumerate(legs):
         label = f"{location_order[i]} → {location_order[i+1]}"
 
-        payload = build_payload(origin, destination)
-        route_data = get_routes(payload, api_key)
-        routes = route_data.get('routes', [])
-
-        for idx, route in enumerate(routes):
-            coords = polyline.decode(route['polyline']['encodedPolyline'])
-            distance_km = route['distanceMeters'] / 1000
-            duration_seconds = int(route['duration'].replace('s', ''))
-            duration_min = duration_seconds / 60
-
+        for idx, (route, coords) in enumerate(geometry[leg]):
             if idx == 0:
                 color = "#00008B"
                 weight = 6
@@ -110,15 +338,93 @@ def plot_routes_from_names(location_order, df, api_key):
                 opacity = 0.6
 
             folium.PolyLine(
-                coords,
+                coords.tolist(),
                 color=color,
                 weight=weight,
                 opacity=opacity,
-                tooltip=f"{label} Route {idx+1}: {distance_km:.1f} km, {duration_min:.0f} min"
+                tooltip=f"{label} Route {idx+1}: {route['distance_km']:.1f} km, {route['duration_min']:.0f} min"
             ).add_to(m)
 
     return m
 
+def route_geometry(location_order, df, api_key, simplify_zoom=None, alternatives=None, output="json"):
+    """
+    Returns the route through location_order as compact data for a client-side
+    map instead of a folium document: ordered stops, per-leg distance and
+    duration, and the same (simplified) geometry plot_routes_from_names draws.
+
+    Parameters:
+    - location_order: Location names in visiting order
+    - df: LocationRegistry or location DataFrame
+    - api_key: Google Maps API key
+    - simplify_zoom, alternatives: As for plot_routes_from_names
+    - output: "json" (lines as encoded polylines) or "geojson" (a FeatureCollection)
+
+    Returns:
+    - dict: For "json", {'stops': [{'name', 'lat', 'lng'}], 'legs': [{'from', 'to',
+      'distance_km', 'duration_min', 'polyline', 'alternatives': [...]}],
+      'total_distance_km', 'total_duration_min', 'bbox'}; leg 'from'/'to' index into stops.
+    """
+    if output not in ("json", "geojson"):
+        raise ValueError("Unsupported output. Choose from: 'json', 'geojson'.")
+    with metrics.timed("route_geometry"):
+        return _route_geometry(location_order, df, api_key, simplify_zoom, alternatives, output)
+
+def _route_geometry(location_order, df, api_key, simplify_zoom, alternatives, output):
+    alternatives = _map_alternatives(alternatives)
+    if len(location_order) < 2:
+        raise ValueError("Need at least two locations in order to plot routes.")
+
+    coords = _lookup_coords(location_order, df)
+    locations = [tuple(coord) for coord in coords.tolist()]
+    leg_routes = fetch_route_legs(locations, api_key, alternatives != "none")
+    geometry = select_map_geometry(leg_routes, simplify_zoom, alternatives)
+
+    def summary(route):
+        return {"distance_km": round(route["distance_km"], 3), "duration_min": round(route["duration_min"], 1)}
+
+    legs = []
+    for i, leg in enumerate(zip(locations, locations[1:])):
+        # Lines are rounded to the polyline precision (~1 m) either way
+        drawn = [(summary(route), np.round(line, 5)) for route, line in geometry[leg]]
+        legs.append({"from": i, "to": i + 1, "routes": drawn})
+
+    points = np.concatenate([coords] + [line for leg in legs for _, line in leg["routes"]])
+    bbox = [round(float(v), 5) for v in (points[:, 1].min(), points[:, 0].min(), points[:, 1].max(), points[:, 0].max())]
+    best = [leg["routes"][0][0] for leg in legs if leg["routes"]]
+    total_distance_km = round(sum(route["distance_km"] for route in best), 3)
+    total_duration_min = round(sum(route["duration_min"] for route in best), 1)
+
+    if output == "geojson":
+        features = [{
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(lng, 6), round(lat, 6)]},
+            "properties": {"kind": "stop", "order": i, "name": location_order[i]},
+        } for i, (lat, lng) in enumerate(locations)]
+        for leg in legs:
+            for rank, (route, line) in enumerate(leg["routes"]):
+                features.append({
+                    "type": "Feature",
+                    "geometry": {"type": "LineString", "coordinates": line[:, ::-1].tolist()},
+                    "properties": {"kind": "leg", "from": leg["from"], "to": leg["to"], "rank": rank, **route},
+                })
+        return {"type": "FeatureCollection", "bbox": bbox, "features": features,
+                "properties": {"total_distance_km": total_distance_km, "total_duration_min": total_duration_min}}
+
+    encoded = []
+    for leg in legs:
+        routes = [{**route, "polyline": encode_polyline(line)} for route, line in leg["routes"]]
+        best_route = routes[0] if routes else {"distance_km": None, "duration_min": None, "polyline": ""}
+        encoded.append({"from": leg["from"], "to": leg["to"], **best_route, "alternatives": routes[1:]})
+    return {
+        "stops": [{"name": name, "lat": round(lat, 6), "lng": round(lng, 6)}
+                  for name, (lat, lng) in zip(location_order, locations)],
+        "legs": encoded,
+        "total_distance_km": total_distance_km,
+        "total_duration_min": total_duration_min,
+        "bbox": bbox,
+    }
+
 
 import random
 
@@ -161,54 +467,510 @@ def calculate_random_route(locations, distance_matrix, duration_matrix, start_in
     }
 
 
-def get_distance_and_duration_matrices(location_names, df_coords, api_key):
+def random_route_baseline(locations, distance_matrix, duration_matrix, start_index,
+                          optimized_distance_km=None, samples=None, seed=None):
     """
-    Returns distance and duration_in_traffic matrices for a list of locations.
+    Distribution of total distance and duration over random visiting orders
+    with a fixed start, as the "non-optimized" reference for a route.
+
+    Draws `samples` seeded random permutations at once as an index array and
+    prices them all with one gather over the matrices; when (n-1)! <= samples,
+    every order is evaluated exactly once instead. Deterministic for a given
+    seed, unlike a single shuffle.
+
     Parameters:
-    - location_names: List of location names matching the 'name' column in df_coords
-    - df_coords: DataFrame with columns ['name', 'lat', 'lon']
-    - api_key: Google Maps Distance Matrix API key
+    - locations (list): List of location names.
+    - distance_matrix, duration_matrix: Matrices in meters / seconds over locations.
+    - start_index (int): Index of the fixed starting location in the locations list.
+    - optimized_distance_km (float): If given, savings against this distance are reported.
+    - samples (int): Permutations to draw (default BASELINE_SAMPLES).
+    - seed (int): Random seed (default BASELINE_SEED).
 
     Returns:
-    - distance_matrix: np.ndarray of distances in meters
-    - duration_matrix: np.ndarray of durations in seconds (including traffic)
+    - dict: {
+        'route', 'total_distance_km', 'total_duration_min': the sampled order at
+            the median distance (same keys as calculate_random_route),
+        'samples', 'exact': orders evaluated, and whether that is all of them,
+        'mean_distance_km', 'median_distance_km', 'std_distance_km',
+        'mean_duration_min', 'median_duration_min',
+        'distance_percentiles_km': {p: km for p in BASELINE_PERCENTILES},
+        'savings' (with optimized_distance_km): {'mean_km', 'median_km',
+            'mean_pct', 'median_pct', 'percentiles_pct': {p: %},
+            'share_worse_than_optimized'}
+      }
     """
+    with metrics.timed("random_baseline"):
+        return _random_route_baseline(locations, distance_matrix, duration_matrix, start_index,
+                                      optimized_distance_km, samples, seed)
 
-    # Filter the DataFrame to only the required locations
-    df_filtered = df_coords[df_coords['Name'].isin(location_names)].copy()
+def _random_route_baseline(locations, distance_matrix, duration_matrix, start_index,
+                           optimized_distance_km, samples, seed):
+    n = len(locations)
+    if not (0 <= start_index < n):
+        raise ValueError(f"Start index {start_index} is out of range for locations list.")
+    samples = BASELINE_SAMPLES if samples is None else samples
+    if samples < 1:
+        raise ValueError("samples must be at least 1.")
+    distance_matrix = np.asarray(distance_matrix, dtype=float)
+    duration_matrix = np.asarray(duration_matrix, dtype=float)
+    remaining = np.array([i for i in range(n) if i != start_index], dtype=np.intp)
 
-    # Ensure correct order
-    df_filtered = df_filtered.set_index('Name').loc[location_names].reset_index()
+    # Rows of visiting orders after the start: every order if that is few enough
+    exact = math.factorial(len(remaining)) <= samples
+    if exact:
+        orders = [np.array(list(itertools.permutations(remaining)), dtype=np.intp).reshape(-1, len(remaining)) if len(remaining)
+                  else np.empty((1, 0), dtype=np.intp)]
+    else:
+        rng = np.random.default_rng(BASELINE_SEED if seed is None else seed)
+        chunk = max(1, BASELINE_CHUNK_ELEMENTS // max(n, 1))
+        orders = [rng.permuted(np.broadcast_to(remaining, (min(chunk, samples - done), len(remaining))), axis=1)
+                  for done in range(0, samples, chunk)]
 
-    coords = list(zip(df_filtered['Latitude'], df_filtered['Longitude']))
+    distances, durations = [], []
+    for order in orders:
+        routes = np.column_stack((np.full(len(order), start_index, dtype=np.intp), order))
+        frm, to = routes[:, :-1], routes[:, 1:]
+        distances.append(distance_matrix[frm, to].sum(axis=1))
+        durations.append(duration_matrix[frm, to].sum(axis=1))
+    distance_km = np.concatenate(distances) / 1000
+    duration_min = np.concatenate(durations) / 60
 
-    def coord_str(coord_list):
-        return "|".join([f"{lat},{lng}" for lat, lng in coord_list])
+    # Representative order: the sample at the median distance
+    median_sample = int(np.argsort(distance_km, kind="stable")[(len(distance_km) - 1) // 2])
+    offset = median_sample
+    for order in orders:
+        if offset < len(order):
+            route = [locations[start_index]] + [locations[i] for i in order[offset]]
+            break
+        offset -= len(order)
 
-    response = requests.get(
-        "https://maps.googleapis.com/maps/api/distancematrix/json",
-        params={
-            "origins": coord_str(coords),
-            "destinations": coord_str(coords),
-            "departure_time": "now",
-            "traffic_model": "best_guess",
-            "key": api_key
+    baseline = {
+        "route": route,
+        "total_distance_km": float(distance_km[median_sample]),
+        "total_duration_min": float(duration_min[median_sample]),
+        "samples": len(distance_km),
+        "exact": exact,
+        "mean_distance_km": float(distance_km.mean()),
+        "median_distance_km": float(np.median(distance_km)),
+        "std_distance_km": float(distance_km.std()),
+        "mean_duration_min": float(duration_min.mean()),
+        "median_duration_min": float(np.median(duration_min)),
+        "distance_percentiles_km": dict(zip(BASELINE_PERCENTILES,
+                                            np.percentile(distance_km, BASELINE_PERCENTILES).tolist())),
+    }
+    if optimized_distance_km is not None:
+        saved_km = distance_km - optimized_distance_km
+        with np.errstate(divide="ignore", invalid="ignore"):
+            saved_pct = np.where(distance_km > 0, saved_km / distance_km * 100, 0.0)
+        baseline["savings"] = {
+            "mean_km": float(saved_km.mean()),
+            "median_km": float(np.median(saved_km)),
+            "mean_pct": float(saved_pct.mean()),
+            "median_pct": float(np.median(saved_pct)),
+            "percentiles_pct": dict(zip(BASELINE_PERCENTILES,
+                                        np.percentile(saved_pct, BASELINE_PERCENTILES).tolist())),
+            "share_worse_than_optimized": float((saved_km > 0).mean()),
         }
-    )
+    return baseline
 
-    data = response.json()
-    N = len(coords)
-    distance_matrix = np.full((N, N), np.inf)
-    duration_matrix = np.full((N, N), np.inf)
+def _lookup_coords(location_names, df_coords):
+    # (k, 2) array of [lat, lng]; df_coords is a LocationRegistry or the location DataFrame
+    with metrics.timed("location_lookup"):
+        return as_location_registry(df_coords).coordinates(location_names)
+
+def get_location_coordinates(location_names, df_coords):
+    """
+    Returns [[lat, lng], ...] for location_names, in order, as plain floats so
+    it can go straight into an optimizer payload ('coordinates', used by the
+    decomposition engine for city-scale stop lists).
+    """
+    return _lookup_coords(location_names, df_coords).tolist()
+
+def _request_matrix(params):
+    # One GET with retries; returns the decoded JSON body of a top-level OK response
+    for attempt in range(max(MATRIX_MAX_ATTEMPTS, 1)):
+        if attempt:
+            time.sleep(MATRIX_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        metrics.inc("route_upstream_api_calls_total", api="distance_matrix")
+        try:
+            # Per HTTP attempt; the whole matrix build is the "distance_matrix" stage (_fetch_pairs)
+            with metrics.timed("distance_matrix_request"):
+                response = get_session().get(DISTANCE_MATRIX_URL, params=params,
+                                             timeout=MATRIX_REQUEST_TIMEOUT_SECONDS)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = f"Distance Matrix request failed: {e}"
+            continue
+        if response.status_code == 429 or response.status_code >= 500:
+            error = f"Distance Matrix returned HTTP {response.status_code}"
+            continue
+        if response.status_code >= 400:
+            raise DistanceMatrixError(f"Distance Matrix returned HTTP {response.status_code}")
+        data = response.json()
+        status = data.get("status", "OK")
+        if status == "OK":
+            return data
+        error = f"Distance Matrix returned {status}: {data.get('error_message', '')}".rstrip(": ")
+        if status not in _RETRYABLE_STATUSES:
+            raise DistanceMatrixError(error)
+    raise DistanceMatrixError(error, retryable=True)
+
+def _fetch_matrix_block(origins, destinations, api_key):
+    """
+    One Distance Matrix request for origins x destinations (lists of (lat, lng)),
+    which must fit the per-request limits (see _tile).
+    Returns (distance, duration) arrays of shape (len(origins), len(destinations)),
+    with np.inf where the API had no route.
+    """
+    def coord_str(coord_list):
+        return "|".join([f"{lat},{lng}" for lat, lng in coord_list])
+
+    _matrix_rate_limiter.acquire(len(origins) * len(destinations))
+    data = _request_matrix({
+        "origins": coord_str(origins),
+        "destinations": coord_str(destinations),
+        "departure_time": "now",
+        "traffic_model": "best_guess",
+        "key": api_key
+    })
+    distance_matrix = np.full((len(origins), len(destinations)), np.inf)
+    duration_matrix = np.full((len(origins), len(destinations)), np.inf)
 
     for i, row in enumerate(data["rows"]):
         for j, element in enumerate(row["elements"]):
             if element["status"] == "OK":
                 distance_matrix[i][j] = element["distance"]["value"]
-                duration_matrix[i][j] = element["duration_in_traffic"]["value"]
+                # Without traffic data for a pair the API only sends the plain duration
+                duration_matrix[i][j] = element.get("duration_in_traffic", element["duration"])["value"]
 
     return distance_matrix, duration_matrix
 
+def _tile(origins, destinations):
+    """
+    Splits origins x destinations (index lists) into (origin_chunk, destination_chunk)
+    blocks that each fit in one Distance Matrix request.
+    """
+    dest_step = min(len(destinations), MAX_MATRIX_DESTINATIONS)
+    origin_step = max(1, min(MAX_MATRIX_ORIGINS, MAX_MATRIX_ELEMENTS // dest_step))
+    return [(origins[i:i + origin_step], destinations[j:j + dest_step])
+            for i in range(0, len(origins), origin_step)
+            for j in range(0, len(destinations), dest_step)]
+
+def _fetch_tiles(tiles, coords, api_key, distance_matrix, duration_matrix, cache=None, bucket=None):
+    """
+    Fills distance_matrix / duration_matrix in place, one request per tile, with
+    up to MATRIX_FETCH_WORKERS requests in flight over the shared session.
+    Tiles that completed are cached even if another one fails.
+    """
+    def fetch(tile):
+        rows, cols = tile
+        return _fetch_matrix_block([coords[i] for i in rows], [coords[j] for j in cols], api_key)
+
+    def store(tile, dist_block, dur_block):
+        rows, cols = tile
+        distance_matrix[np.ix_(rows, cols)] = dist_block
+        duration_matrix[np.ix_(rows, cols)] = dur_block
+        if cache is not None:
+            cache.put_many([coords[i] for i in rows], [coords[j] for j in cols], bucket, dist_block, dur_block)
+
+    if len(tiles) <= 1 or MATRIX_FETCH_WORKERS <= 1:
+        for tile in tiles:
+            store(tile, *fetch(tile))
+        return
+
+    with ThreadPoolExecutor(max_workers=min(MATRIX_FETCH_WORKERS, len(tiles))) as executor:
+        futures = {executor.submit(fetch, tile): tile for tile in tiles}
+        try:
+            for future in as_completed(futures):
+                store(futures[future], *future.result())
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+def haversine_matrix(origins, destinations=None):
+    """
+    Great-circle distances in metres between every origin and destination
+    ((lat, lng) sequences; destinations default to origins), computed for all
+    pairs at once with broadcasting and in-place updates, so thousands of
+    stops take milliseconds rather than a Python loop over N^2 pairs.
+    """
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    destinations = origins if destinations is None else np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+    lat1, lng1, lat2, lng2 = origins[:, 0], origins[:, 1], destinations[:, 0], destinations[:, 1]
+    # a = sin^2(dlat / 2) + cos lat1 cos lat2 sin^2(dlng / 2)
+    a = np.subtract.outer(lat1, lat2)
+    a *= 0.5
+    np.sin(a, out=a)
+    a *= a
+    b = np.subtract.outer(lng1, lng2)
+    b *= 0.5
+    np.sin(b, out=b)
+    b *= b
+    b *= np.multiply.outer(np.cos(lat1), np.cos(lat2))
+    a += b
+    np.clip(a, 0.0, 1.0, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS_M
+    return a
+
+
+class TravelEstimator:
+    """
+    Offline distance/duration estimate from coordinates alone.
+
+    Parameters:
+    - circuity (float): Road distance / great-circle distance.
+    - speed_mps (float): Average speed over the road distance, in m/s.
+    - overhead_seconds (float): Fixed time per trip (junctions, parking).
+    - samples (int): API results the factors were fitted from (0 = defaults).
+    """
+
+    def __init__(self, circuity=DEFAULT_CIRCUITY, speed_mps=DEFAULT_SPEED_MPS,
+                 overhead_seconds=DEFAULT_OVERHEAD_SECONDS, samples=0):
+        self.circuity = circuity
+        self.speed_mps = speed_mps
+        self.overhead_seconds = overhead_seconds
+        self.samples = samples
+        self.fitted_at = time.time()
+
+    @classmethod
+    def fit(cls, straight_m, distance_m, duration_s):
+        """
+        Fits the factors from observed pairs: circuity as the median ratio of
+        road to straight-line distance (pairs under 200 m are too noisy), speed
+        and overhead as a least-squares line of duration over road distance.
+        Falls back to the defaults with fewer than MIN_CALIBRATION_PAIRS pairs.
+        """
+        usable = (straight_m > 200) & np.isfinite(distance_m) & np.isfinite(duration_s) & (duration_s > 0)
+        straight_m, distance_m, duration_s = straight_m[usable], distance_m[usable], duration_s[usable]
+        if len(straight_m) < MIN_CALIBRATION_PAIRS:
+            return cls()
+        circuity = float(np.median(distance_m / straight_m))
+        slope, intercept = np.polyfit(distance_m, duration_s, 1)
+        if slope > 0 and intercept >= 0:
+            speed_mps, overhead_seconds = 1.0 / slope, float(intercept)
+        else:
+            speed_mps, overhead_seconds = float(np.median(distance_m / duration_s)), 0.0
+        return cls(circuity, speed_mps, overhead_seconds, samples=len(straight_m))
+
+    def matrices(self, origins, destinations=None):
+        """Returns estimated (distance in m, duration in s) matrices; zero for identical points."""
+        distance_matrix = haversine_matrix(origins, destinations)
+        distance_matrix *= self.circuity
+        duration_matrix = distance_matrix / self.speed_mps
+        duration_matrix += self.overhead_seconds
+        duration_matrix[distance_matrix == 0] = 0.0
+        return distance_matrix, duration_matrix
+
+
+def fit_travel_estimator(bucket=None):
+    """
+    Fits a TravelEstimator to the API results in the travel-time cache
+    (optionally one departure bucket only), or returns the defaults if the
+    cache is off or holds too few pairs.
+    """
+    cache = get_travel_cache()
+    if cache is None:
+        return TravelEstimator()
+    origin_lat, origin_lng, destination_lat, destination_lng, distance_m, duration_s = cache.observations(bucket)
+    if len(distance_m) < MIN_CALIBRATION_PAIRS:
+        return TravelEstimator()
+    # Row-wise great-circle distance of each observed pair (not the full grid)
+    lat1, lng1, lat2, lng2 = map(np.radians, (origin_lat, origin_lng, destination_lat, destination_lng))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    straight_m = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return TravelEstimator.fit(straight_m, distance_m, duration_s)
+
+
+_estimator = None
+_estimator_lock = threading.Lock()
+
+
+def get_travel_estimator():
+    """Returns the process-wide TravelEstimator, refitted from the cache every ESTIMATOR_REFIT_SECONDS."""
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None or time.time() - _estimator.fitted_at > ESTIMATOR_REFIT_SECONDS:
+            _estimator = fit_travel_estimator()
+        return _estimator
+
+
+def estimate_distance_and_duration_matrices(location_names, df_coords, estimator=None):
+    """
+    Offline counterpart of get_distance_and_duration_matrices: same arguments
+    (without the API key) and return values, from coordinates and the fitted
+    estimator only. Costs no quota, so it can also pre-filter candidates
+    before an exact fetch.
+    """
+    coords = _lookup_coords(location_names, df_coords)
+    with metrics.timed("matrix_estimate"):
+        return (estimator or get_travel_estimator()).matrices(coords)
+
+def _fetch_pairs(coords, needed, api_key):
+    """
+    Returns (distance, duration) matrices over coords with every pair where
+    needed is True filled in, and np.nan elsewhere.
+
+    Pairs come from the travel-time cache when it has them for the current
+    departure bucket; the rest are fetched, origins that lack the same
+    destinations sharing requests tiled to the API limits, and cached. If the
+    API is unreachable, the pairs still missing are estimated offline
+    (MATRIX_FALLBACK) and both matrices come back as EstimatedMatrix.
+
+    The whole call is the "distance_matrix" stage, cache hits included; each
+    HTTP attempt is also timed on its own as "distance_matrix_request".
+    """
+    with metrics.timed("distance_matrix"):
+        return _fill_pairs(coords, needed, api_key)
+
+def _fill_pairs(coords, needed, api_key):
+    N = len(coords)
+    distance_matrix = np.full((N, N), np.nan)
+    duration_matrix = np.full((N, N), np.nan)
+    missing = np.array(needed, dtype=bool)
+
+    cache = get_travel_cache()
+    bucket = departure_bucket()
+    if cache is not None and missing.any():
+        with metrics.timed("travel_cache_lookup"):
+            cached_distance, cached_duration, found = cache.get_many(coords, coords, bucket)
+        hit = missing & found
+        distance_matrix[hit] = cached_distance[hit]
+        duration_matrix[hit] = cached_duration[hit]
+        missing &= ~found
+        metrics.inc("route_travel_cache_pairs_total", int(hit.sum()), result="hit")
+        metrics.inc("route_travel_cache_pairs_total", int(missing.sum()), result="miss")
+
+    groups = {}
+    for row in np.flatnonzero(missing.any(axis=1)):
+        groups.setdefault(tuple(np.flatnonzero(missing[row])), []).append(row)
+    tiles = [tile for cols, rows in groups.items() for tile in _tile(rows, list(cols))]
+    try:
+        _fetch_tiles(tiles, coords, api_key, distance_matrix, duration_matrix, cache, bucket)
+    except (DistanceMatrixError, requests.RequestException) as e:
+        if MATRIX_FALLBACK != "estimate" or not getattr(e, "retryable", True):
+            raise
+        # Tiles that arrived keep their API values; only the rest is estimated
+        unfilled = np.asarray(needed, dtype=bool) & np.isnan(distance_matrix)
+        logger.warning("Distance Matrix fetch failed (%s); estimating %d pairs offline", e, int(unfilled.sum()))
+        metrics.inc("route_matrix_estimated_pairs_total", int(unfilled.sum()))
+        estimated_distance, estimated_duration = get_travel_estimator().matrices(coords)
+        distance_matrix[unfilled] = estimated_distance[unfilled]
+        duration_matrix[unfilled] = estimated_duration[unfilled]
+        if unfilled.any():
+            distance_matrix, duration_matrix = distance_matrix.view(EstimatedMatrix), duration_matrix.view(EstimatedMatrix)
+    return distance_matrix, duration_matrix
+
+def get_distance_and_duration_matrices(location_names, df_coords, api_key):
+    """
+    Returns distance and duration_in_traffic matrices for a list of locations.
+    Parameters:
+    - location_names: List of location names matching the 'Name' column in df_coords
+    - df_coords: LocationRegistry, or DataFrame with columns ['Name', 'Latitude', 'Longitude']
+    - api_key: Google Maps Distance Matrix API key
+
+    Returns:
+    - distance_matrix: np.ndarray of distances in meters
+    - duration_matrix: np.ndarray of durations in seconds (including traffic)
+
+    Pairs already in the travel-time cache (see travel_cache.py) for the
+    current departure bucket are not requested again. If the API was down and
+    pairs had to be estimated, the matrices are EstimatedMatrix (see
+    matrices_estimated) and results built on them shouldn't be cached.
+    """
+    coords = _lookup_coords(location_names, df_coords)
+    return _fetch_pairs(coords, np.ones((len(coords), len(coords)), dtype=bool), api_key)
+
+def update_distance_and_duration_matrices(previous_names, previous_distance, previous_duration,
+                                          location_names, df_coords, api_key):
+    """
+    Builds the matrices for location_names from a previous plan's matrices,
+    requesting only the rows and columns of stops that were not in it.
+
+    Parameters:
+    - previous_names: Location names the previous matrices were built for
+    - previous_distance, previous_duration: The previous matrices (N_prev x N_prev)
+    - location_names, df_coords, api_key: As for get_distance_and_duration_matrices
+
+    Returns:
+    - distance_matrix, duration_matrix for location_names, in that order
+    """
+    previous_estimated = matrices_estimated(previous_distance, previous_duration)
+    previous_distance = np.asarray(previous_distance, dtype=float)
+    previous_duration = np.asarray(previous_duration, dtype=float)
+    previous_index = {name: i for i, name in enumerate(previous_names)}
+
+    old = [i for i, name in enumerate(location_names) if name in previous_index]
+    src = [previous_index[location_names[i]] for i in old]
+
+    # Everything except the pairs the previous plan already has
+    coords = _lookup_coords(location_names, df_coords)
+    needed = np.ones((len(coords), len(coords)), dtype=bool)
+    needed[np.ix_(old, old)] = False
+    distance_matrix, duration_matrix = _fetch_pairs(coords, needed, api_key)
+    distance_matrix[np.ix_(old, old)] = previous_distance[np.ix_(src, src)]
+    duration_matrix[np.ix_(old, old)] = previous_duration[np.ix_(src, src)]
+    if previous_estimated:
+        distance_matrix, duration_matrix = distance_matrix.view(EstimatedMatrix), duration_matrix.view(EstimatedMatrix)
+
+    return distance_matrix, duration_matrix
+
+def get_batch_distance_and_duration_matrices(stop_sets, df_coords, api_key):
+    """
+    Builds the matrices a batch of routes needs, fetching every ordered pair
+    that some route uses exactly once and no pair that none does.
+
+    Origins that lack the same destinations share requests, tiled to the
+    API's per-request limits, so overlapping sets (e.g. a shared depot) only
+    pay for the pairs they add. Pairs in the travel-time cache are not fetched.
+
+    Parameters:
+    - stop_sets: List of location-name lists, one per route
+    - df_coords, api_key: As for get_distance_and_duration_matrices
+
+    Returns:
+    - location_names: Every distinct name in stop_sets, in first-seen order
+    - distance_matrix, duration_matrix: Over location_names; pairs no route
+      needs are np.nan
+    """
+    location_names = list(dict.fromkeys(name for stops in stop_sets for name in stops))
+    positions = {name: i for i, name in enumerate(location_names)}
+    N = len(location_names)
+    if N == 0:
+        return location_names, np.full((0, 0), np.nan), np.full((0, 0), np.nan)
+
+    needed = np.zeros((N, N), dtype=bool)
+    for stops in stop_sets:
+        idx = [positions[name] for name in stops]
+        needed[np.ix_(idx, idx)] = True
+    coords = _lookup_coords(location_names, df_coords)
+    distance_matrix, duration_matrix = _fetch_pairs(coords, needed, api_key)
+    return location_names, distance_matrix, duration_matrix
+
+# Operating figures per truck type: km per litre of diesel, driver wage per
+# trip (₹) and maintenance per km (₹)
+TRUCK_SPECS = {
+    "LCV": {"mileage": 10, "driver_wage": 400, "maintenance_per_km": 1.2},
+    "MCV": {"mileage": 8, "driver_wage": 500, "maintenance_per_km": 1.5},
+    "HCV": {"mileage": 5, "driver_wage": 600, "maintenance_per_km": 2.0}
+}
+COLD_CHAIN_COST_PER_KM = 0.75  # ₹ per km for refrigerated transport
+
+def _trip_cost_components(distance_km, mileage, driver_wage, maintenance_per_km, fuel_price_per_litre, toll, cold_chain):
+    # Plain arithmetic, so the same formula prices one trip with Python floats
+    # or a whole grid with broadcast NumPy arrays
+    fuel_cost = distance_km / mileage * fuel_price_per_litre
+    maintenance_cost = maintenance_per_km * distance_km
+    cold_chain_cost = COLD_CHAIN_COST_PER_KM * distance_km * cold_chain
+    total_cost = fuel_cost + driver_wage + maintenance_cost + toll + cold_chain_cost
+    return fuel_cost, maintenance_cost, cold_chain_cost, total_cost
+
+def _truck_specs(truck_type):
+    if truck_type not in TRUCK_SPECS:
+        raise ValueError("Unsupported truck type. Choose from: 'LCV', 'MCV', 'HCV'.")
+    return TRUCK_SPECS[truck_type]
+
 def calculate_trip_cost(distance_km, truck_type="MCV", fuel_price_per_litre=87.0, toll=0, cold_chain=True):
     """
     Calculate the cost of a logistics trip based on distance, truck type, and operating factors.
@@ -223,39 +985,83 @@ def calculate_trip_cost(distance_km, truck_type="MCV", fuel_price_per_litre=87.0
     Returns:
     - dict: Detailed cost breakdown and total cost.
     """
+    with metrics.timed("trip_cost"):
+        return _calculate_trip_cost(distance_km, truck_type, fuel_price_per_litre, toll, cold_chain)
 
-    # Define truck parameters
-    truck_specs = {
-        "LCV": {"mileage": 10, "driver_wage": 400, "maintenance_per_km": 1.2},
-        "MCV": {"mileage": 8, "driver_wage": 500, "maintenance_per_km": 1.5},
-        "HCV": {"mileage": 5, "driver_wage": 600, "maintenance_per_km": 2.0}
-    }
-
-    if truck_type not in truck_specs:
-        raise ValueError("Unsupported truck type. Choose from: 'LCV', 'MCV', 'HCV'.")
-
-    specs = truck_specs[truck_type]
-
-    # Calculate basic cost components
-    fuel_required = distance_km / specs["mileage"]
-    fuel_cost = fuel_required * fuel_price_per_litre
-    driver_cost = specs["driver_wage"]
-    maintenance_cost = specs["maintenance_per_km"] * distance_km
-
-    # Cold chain surcharge
-    cold_chain_cost = 0
-    if cold_chain:
-        cold_chain_cost = 0.75 * distance_km  # ₹0.75 per km
-
-    total_cost = fuel_cost + driver_cost + maintenance_cost + toll + cold_chain_cost
+def _calculate_trip_cost(distance_km, truck_type="MCV", fuel_price_per_litre=87.0, toll=0, cold_chain=True):
+    specs = _truck_specs(truck_type)
+    fuel_cost, maintenance_cost, cold_chain_cost, total_cost = _trip_cost_components(
+        distance_km, specs["mileage"], specs["driver_wage"], specs["maintenance_per_km"],
+        fuel_price_per_litre, toll, bool(cold_chain))
 
     return {
         "truck_type": truck_type,
         "distance_km": distance_km,
         "fuel_cost": round(fuel_cost, 2),
-        "driver_cost": round(driver_cost, 2),
+        "driver_cost": round(specs["driver_wage"], 2),
         "maintenance_cost": round(maintenance_cost, 2),
         "toll_cost": round(toll, 2),
         "cold_chain_cost": round(cold_chain_cost, 2),
         "total_trip_cost": round(total_cost, 2)
 }
+
+def calculate_trip_costs(distances_km, truck_types=("LCV", "MCV", "HCV"), fuel_prices_per_litre=(87.0,), tolls=(0.0,), cold_chain=True):
+    """
+    Prices many trips under every combination of truck type, fuel price and
+    toll scenario in one NumPy broadcast over (trip, truck, fuel price, toll),
+    with the same formula as calculate_trip_cost.
+
+    Parameters:
+    - distances_km (array-like): Trip distances in kilometers, shape (n,).
+    - truck_types (sequence): Truck types to price ('LCV', 'MCV', 'HCV').
+    - fuel_prices_per_litre (array-like): Diesel price scenarios in ₹.
+    - tolls (array-like): Toll scenarios in ₹, shape (k,) for the same tolls on
+      every trip or (n, k) for per-trip tolls.
+    - cold_chain (bool): If True, adds cost for refrigerated transport.
+
+    Returns:
+    - DataFrame: One row per trip x truck type x fuel price x toll scenario, with
+      'trip' (position in distances_km), 'truck_type', 'distance_km',
+      'fuel_price_per_litre', 'toll_scenario' and the cost columns of
+      calculate_trip_cost, rounded to paise.
+    """
+    with metrics.timed("trip_cost_batch"):
+        return _calculate_trip_costs(distances_km, truck_types, fuel_prices_per_litre, tolls, cold_chain)
+
+def _calculate_trip_costs(distances_km, truck_types, fuel_prices_per_litre, tolls, cold_chain):
+    distances = np.asarray(distances_km, dtype=float).ravel()
+    truck_types = [truck_types] if isinstance(truck_types, str) else list(truck_types)
+    specs = np.array([[_truck_specs(t)["mileage"], _truck_specs(t)["driver_wage"], _truck_specs(t)["maintenance_per_km"]]
+                      for t in truck_types], dtype=float)
+    prices = np.atleast_1d(np.asarray(fuel_prices_per_litre, dtype=float))
+    tolls = np.asarray(tolls, dtype=float)
+    if tolls.ndim == 2 and tolls.shape[0] != len(distances):
+        raise ValueError(f"Per-trip tolls need one row per trip, got {tolls.shape[0]} rows for {len(distances)} trips.")
+    n, t, f = len(distances), len(truck_types), len(prices)
+
+    # Axes: trip, truck type, fuel price, toll scenario
+    distance = distances[:, None, None, None]
+    mileage, driver_wage, maintenance_per_km = (specs[:, i][None, :, None, None] for i in range(3))
+    price = prices[None, None, :, None]
+    toll = tolls.reshape(n, 1, 1, -1) if tolls.ndim == 2 else np.atleast_1d(tolls)[None, None, None, :]
+    k = toll.shape[-1]
+    fuel_cost, maintenance_cost, cold_chain_cost, total_cost = _trip_cost_components(
+        distance, mileage, driver_wage, maintenance_per_km, price, toll, bool(cold_chain))
+
+    shape = (n, t, f, k)
+    def column(values):
+        return np.broadcast_to(values, shape).ravel()
+
+    return pd.DataFrame({
+        "trip": column(np.arange(n)[:, None, None, None]),
+        "truck_type": np.asarray(truck_types, dtype=object)[column(np.arange(t)[None, :, None, None])],
+        "distance_km": column(distance),
+        "fuel_price_per_litre": column(price),
+        "toll_scenario": column(np.arange(k)[None, None, None, :]),
+        "fuel_cost": column(fuel_cost).round(2),
+        "driver_cost": column(driver_wage).round(2),
+        "maintenance_cost": column(maintenance_cost).round(2),
+        "toll_cost": column(toll).round(2),
+        "cold_chain_cost": column(cold_chain_cost).round(2),
+        "total_trip_cost": column(total_cost).round(2),
+    })
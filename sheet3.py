@@ -7,31 +7,27 @@ import streamlit as st
 import pandas as pd
 from style_sheet import small_colored_kpi_html,select_html
 from streamlit_folium import st_folium
-from routing import plot_routes_from_names, calculate_random_route,get_distance_and_duration_matrices,calculate_trip_cost
+from routing import plot_routes_from_names, random_route_baseline,get_distance_and_duration_matrices,calculate_trip_cost,get_location_coordinates,matrices_estimated
 from dotenv import load_dotenv
 import numpy as np
-import subprocess
-import json
-
-def run_ortools_backend(input_payload: dict):
-    process = subprocess.Popen(
-        ["venv_ortools/Scripts/python", "utils/optimizer.py"],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    input_json = json.dumps(input_payload)
-    stdout, stderr = process.communicate(input=input_json)
-
-    if process.returncode != 0:
-        raise RuntimeError(f"Error: {stderr}")
-
-    return json.loads(stdout)
-
-@st.cache_data
+from result_cache import cache_from_env, cache_key, location_table_version
+from route_backend_backend import SOLVER_PARAMS
+from optimizer_client import run_ortools_backend
+from matrix_transport import matrix_payload
+from locations import LOCATIONS_PATH, load_locations, load_location_registry
+
 def route_data():
-    return pd.read_excel(r'data\locations.xlsx')
+    # Shared snapshot of the workbook; re-read only when the file changes on disk
+    return load_locations(LOCATIONS_PATH)
+
+def location_registry():
+    # Indexed name -> coordinates lookup for the routing calls, rebuilt with the snapshot
+    return load_location_registry(LOCATIONS_PATH)
+
+@st.cache_resource
+def route_result_cache():
+    # Shared across reruns and sessions; holds matrices, optimizer result and map HTML
+    return cache_from_env()
 
 st.markdown("""
     <style>
@@ -167,53 +163,71 @@ if not df.empty:
 
         if optimize_clicked and api_key:
             with st.spinner("⏳ Optimizing route..."):
-                dist_matrix, dur_matrix = get_distance_and_duration_matrices(
-                    location_names, df, api_key)
-                
-            
-
-                if isinstance(dist_matrix, np.ndarray):
-                    dist_matrix = dist_matrix.tolist()
-                if isinstance(dur_matrix, np.ndarray):
-                    dur_matrix = dur_matrix.tolist()
-
-
-                # result = solve_open_tsp(
-                #     dist_matrix,
-                #     dur_matrix,
-                #     location_names,
-                #     location_names.index(start_location),
-                # )
-                # Call backend script using subprocess in ortools-env
-                payload = {
-                "distance_matrix": dist_matrix,
-                "time_matrix": dur_matrix,
-                "location_names": location_names,
-                "start_index": location_names.index(start_location),}
-                # Parse the output
-                result=json.loads(subprocess.run(
-                    ["venv_ortools\\Scripts\\python.exe", "utils\\optimizer.py"],
-                    input=json.dumps(payload).encode(),
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,).stdout.decode("utf-8", errors="ignore"))
+                result_cache = route_result_cache()
+                key = cache_key(location_names, location_names.index(start_location),
+                                SOLVER_PARAMS, location_table_version(LOCATIONS_PATH), kind="route_plan")
+                cached = result_cache.get(key)
+
+                if cached is None:
+                    dist_matrix, dur_matrix = get_distance_and_duration_matrices(
+                        location_names, location_registry(), api_key)
+                    matrix_estimated = matrices_estimated(dist_matrix, dur_matrix)
+
+                    if isinstance(dist_matrix, np.ndarray):
+                        dist_matrix = dist_matrix.tolist()
+                    if isinstance(dur_matrix, np.ndarray):
+                        dur_matrix = dur_matrix.tolist()
+
+                    # result = solve_open_tsp(
+                    #     dist_matrix,
+                    #     dur_matrix,
+                    #     location_names,
+                    #     location_names.index(start_location),
+                    # )
+                    # Solve in-process or on the OR-Tools optimizer daemon
+                    payload = {
+                    "location_names": location_names,
+                    "start_index": location_names.index(start_location),
+                    "coordinates": get_location_coordinates(location_names, location_registry()),}
+                    with matrix_payload(payload, dist_matrix, dur_matrix) as payload:
+                        result = run_ortools_backend(payload)
+
+                    # MAP
+                    map_html = plot_routes_from_names(result["route"], location_registry(), api_key)._repr_html_()
+
+                    cached = {
+                        "dist_matrix": dist_matrix,
+                        "dur_matrix": dur_matrix,
+                        "result": result,
+                        "map_html": map_html,
+                    }
+                    if matrix_estimated:
+                        # Distance Matrix API was down; don't keep an estimated plan for the whole TTL
+                        st.warning("⚠️ Google Maps distances were unavailable; this plan uses estimated travel times.")
+                    else:
+                        result_cache.set(key, cached)
+
+                dist_matrix = cached["dist_matrix"]
+                dur_matrix = cached["dur_matrix"]
+                result = cached["result"]
+                map_html = cached["map_html"]
 
                 route = result["route"]
                 cost = calculate_trip_cost(result["total_distance_km"])
 
-                non_opt_result = calculate_random_route(
+                # Median of many seeded random orders, so the KPIs don't change between reruns
+                non_opt_result = random_route_baseline(
                     location_names,
                     dist_matrix,
                     dur_matrix,
                     location_names.index(start_location),
+                    optimized_distance_km=result["total_distance_km"],
                 )
                 worst_cost = calculate_trip_cost(non_opt_result["total_distance_km"])
 
                 route_str = " → ".join(route)
                 non_opt_route_str = " → ".join(non_opt_result["route"])
 
-                # MAP
-                map_obj = plot_routes_from_names(route, df, api_key)
-
                 col1, col2 = st.columns(2)
 
                 # Non-optimized KPIs
@@ -233,6 +247,13 @@ if not df.empty:
                             small_colored_kpi_html("⛽ Fuel Cost (₹)", f"₹{worst_cost['fuel_cost']:.2f}", "#ffd9cc", "#661400"),
                             unsafe_allow_html=True
                         )
+                    savings = non_opt_result["savings"]
+                    st.caption(
+                        f"Median of {non_opt_result['samples']:,} random orders "
+                        f"({non_opt_result['distance_percentiles_km'][5]:.1f}–{non_opt_result['distance_percentiles_km'][95]:.1f} km, 5th–95th pct). "
+                        f"Optimizing saves {savings['median_pct']:.1f}% median, "
+                        f"{savings['percentiles_pct'][5]:.1f}–{savings['percentiles_pct'][95]:.1f}% across them."
+                    )
 
                 # Optimized KPIs
                 with col2:
@@ -253,7 +274,7 @@ if not df.empty:
                         )
 
 
-                st.components.v1.html(map_obj._repr_html_(), height=400)
+                st.components.v1.html(map_html, height=400)
 
     elif len(location_names) > 5:
         st.warning("⚠️ Please select **at most 4 ** delivery locations.")
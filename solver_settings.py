@@ -0,0 +1,36 @@
+# Search settings optimizer.py runs with. Kept free of OR-Tools imports so the
+# web and Streamlit processes can put them in their result cache keys (see
+# route_backend_backend.SOLVER_PARAMS): changing any of them changes the routes.
+
+# Search budget: BASE + PER_STOP * N seconds, capped at MAX, unless the caller sets one
+BASE_TIME_LIMIT_SECONDS = 2.0
+PER_STOP_TIME_LIMIT_SECONDS = 0.2
+MAX_TIME_LIMIT_SECONDS = 30.0
+MIN_TIME_LIMIT_SECONDS = 0.2
+# Time kept back from a request deadline for reading the result and replying
+DEADLINE_MARGIN_SECONDS = 0.5
+
+# Stop once the best objective has not improved by more than PLATEAU_GAP (relative)
+# for PLATEAU_FRACTION of the budget (at least MIN_PLATEAU_SECONDS). Guided local
+# search improves in bursts with stalls of up to ~55% of the budget on the
+# benchmark set (N=80..200), so the window has to be longer than that
+PLATEAU_FRACTION = 0.75
+MIN_PLATEAU_SECONDS = 2.0
+PLATEAU_GAP = 1e-3
+# Warm starts begin next to a good solution, so they give up on plateaus sooner
+WARM_START_PLATEAU_FRACTION = 0.1
+
+# Default first-solution heuristic and metaheuristic (routing_enums_pb2 member names)
+FIRST_SOLUTION_STRATEGY = "PATH_CHEAPEST_ARC"
+LOCAL_SEARCH_METAHEURISTIC = "GUIDED_LOCAL_SEARCH"
+
+# Decomposition engine for full-city runs (see solve_decomposed)
+DECOMPOSE_MIN_STOPS = 800
+DECOMPOSE_CLUSTER_SIZE = 150
+# Stops on each side of a cluster boundary re-solved exactly after stitching
+SEAM_WINDOW = 7
+# Final pass over the whole stitched route: 2-opt and Or-opt moves that create
+# an edge to one of a stop's GLOBAL_NEIGHBOURS nearest stops, for
+# GLOBAL_PASS_SECONDS_PER_STOP x N seconds (capped at MAX_TIME_LIMIT_SECONDS)
+GLOBAL_NEIGHBOURS = 10
+GLOBAL_PASS_SECONDS_PER_STOP = 0.005
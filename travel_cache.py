@@ -0,0 +1,173 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+import numpy as np
+
+# SQLite file holding fetched origin/destination pairs; shared by every process on the machine
+TRAVEL_CACHE_PATH = os.getenv("TRAVEL_CACHE_PATH", os.path.join(tempfile.gettempdir(), "route-travel-times.sqlite"))
+# Seconds a fetched pair stays valid (default 30 days); stores rarely move, traffic patterns drift slowly
+TRAVEL_CACHE_TTL = float(os.getenv("TRAVEL_CACHE_TTL", str(30 * 24 * 3600)))
+# Width of a departure-time bucket: pairs fetched at 09:10 answer requests at 09:50, not at 18:00
+TRAVEL_CACHE_BUCKET_MINUTES = int(os.getenv("TRAVEL_CACHE_BUCKET_MINUTES", "60"))
+# Set TRAVEL_CACHE=0 to always ask the Distance Matrix API like before
+USE_TRAVEL_CACHE = os.getenv("TRAVEL_CACHE", "1") != "0"
+
+# Coordinates are keyed at 6 decimals (~0.1 m), so float noise from the workbook never splits a key
+COORD_DECIMALS = 6
+# Stay under SQLite's bound-parameter limit on older builds (999)
+_QUERY_CHUNK = 400
+
+
+def departure_bucket(when=None, bucket_minutes=TRAVEL_CACHE_BUCKET_MINUTES):
+    """Time-of-day bucket (local time) that a departure at `when` (epoch seconds, default now) falls into."""
+    local = time.localtime(time.time() if when is None else when)
+    return (local.tm_hour * 60 + local.tm_min) // bucket_minutes
+
+
+def coord_key(lat, lng):
+    return f"{float(lat):.{COORD_DECIMALS}f},{float(lng):.{COORD_DECIMALS}f}"
+
+
+class TravelTimeCache:
+    """
+    Persistent cache of Distance Matrix results per origin/destination pair.
+
+    Each row holds the distance (m) and duration in traffic (s) for one ordered
+    coordinate pair and departure-time bucket. Pairs the API had no route for
+    are stored too (as NULL) so they are not asked for again. Rows older than
+    ttl_seconds are ignored and pruned by prune().
+
+    Parameters:
+    - path (str): SQLite database file; created if missing.
+    - ttl_seconds (float): Lifetime of a pair; None keeps pairs forever.
+    """
+
+    def __init__(self, path=TRAVEL_CACHE_PATH, ttl_seconds=TRAVEL_CACHE_TTL):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by this process's threads; WAL lets the Flask,
+        # Streamlit and worker processes read while one of them writes
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS travel ("
+                " origin TEXT NOT NULL, destination TEXT NOT NULL, bucket INTEGER NOT NULL,"
+                " distance_m REAL, duration_s REAL, fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (origin, destination, bucket)) WITHOUT ROWID")
+
+    def _cutoff(self):
+        return time.time() - self.ttl_seconds if self.ttl_seconds is not None else float("-inf")
+
+    def get_many(self, origins, destinations, bucket):
+        """
+        Looks up every origins x destinations pair (lists of (lat, lng)).
+
+        Returns:
+        - distance_matrix, duration_matrix: np.ndarray, np.inf for unreachable pairs
+        - found: Boolean np.ndarray, False where the pair is not cached (or expired)
+        """
+        origin_keys = [coord_key(lat, lng) for lat, lng in origins]
+        destination_keys = [coord_key(lat, lng) for lat, lng in destinations]
+        shape = (len(origin_keys), len(destination_keys))
+        distance_matrix = np.full(shape, np.inf)
+        duration_matrix = np.full(shape, np.inf)
+        found = np.zeros(shape, dtype=bool)
+        if not origin_keys or not destination_keys:
+            return distance_matrix, duration_matrix, found
+
+        # The same coordinates may appear under two names; every position gets the value
+        origin_rows, destination_cols = {}, {}
+        for i, key in enumerate(origin_keys):
+            origin_rows.setdefault(key, []).append(i)
+        for j, key in enumerate(destination_keys):
+            destination_cols.setdefault(key, []).append(j)
+        unique_origins, unique_destinations = list(origin_rows), list(destination_cols)
+
+        cutoff = self._cutoff()
+        with self._lock:
+            for a in range(0, len(unique_origins), _QUERY_CHUNK):
+                origin_chunk = unique_origins[a:a + _QUERY_CHUNK]
+                for b in range(0, len(unique_destinations), _QUERY_CHUNK):
+                    destination_chunk = unique_destinations[b:b + _QUERY_CHUNK]
+                    rows = self._conn.execute(
+                        "SELECT origin, destination, distance_m, duration_s FROM travel"
+                        " WHERE bucket = ? AND fetched_at >= ?"
+                        f" AND origin IN ({','.join('?' * len(origin_chunk))})"
+                        f" AND destination IN ({','.join('?' * len(destination_chunk))})",
+                        [bucket, cutoff, *origin_chunk, *destination_chunk])
+                    for origin, destination, distance, duration in rows:
+                        index = np.ix_(origin_rows[origin], destination_cols[destination])
+                        found[index] = True
+                        if distance is not None and duration is not None:
+                            distance_matrix[index] = distance
+                            duration_matrix[index] = duration
+        return distance_matrix, duration_matrix, found
+
+    def put_many(self, origins, destinations, bucket, distance_matrix, duration_matrix):
+        """Stores an origins x destinations block as returned by the Distance Matrix API."""
+        now = time.time()
+        origin_keys = [coord_key(lat, lng) for lat, lng in origins]
+        destination_keys = [coord_key(lat, lng) for lat, lng in destinations]
+        rows = []
+        for i, origin in enumerate(origin_keys):
+            for j, destination in enumerate(destination_keys):
+                distance, duration = distance_matrix[i][j], duration_matrix[i][j]
+                reachable = np.isfinite(distance) and np.isfinite(duration)
+                rows.append((origin, destination, bucket,
+                             float(distance) if reachable else None,
+                             float(duration) if reachable else None, now))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO travel VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def observations(self, bucket=None, limit=200000):
+        """
+        Returns fresh reachable pairs for calibrating estimators, as float arrays
+        (origin_lat, origin_lng, destination_lat, destination_lng, distance_m, duration_s),
+        optionally only those fetched for one departure bucket.
+        """
+        query = ("SELECT origin, destination, distance_m, duration_s FROM travel"
+                 " WHERE fetched_at >= ? AND distance_m IS NOT NULL AND origin != destination")
+        params = [self._cutoff()]
+        if bucket is not None:
+            query += " AND bucket = ?"
+            params.append(bucket)
+        with self._lock:
+            rows = self._conn.execute(query + " LIMIT ?", params + [limit]).fetchall()
+        if not rows:
+            return tuple(np.empty(0) for _ in range(6))
+        origins = np.array([origin.split(",") for origin, _, _, _ in rows], dtype=float)
+        destinations = np.array([destination.split(",") for _, destination, _, _ in rows], dtype=float)
+        values = np.array([(distance, duration) for _, _, distance, duration in rows], dtype=float)
+        return origins[:, 0], origins[:, 1], destinations[:, 0], destinations[:, 1], values[:, 0], values[:, 1]
+
+    def prune(self):
+        """Deletes expired pairs; returns how many were removed."""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM travel WHERE fetched_at < ?", (self._cutoff(),)).rowcount
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM travel")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_travel_cache():
+    """Returns the process-wide TravelTimeCache, or None when TRAVEL_CACHE=0."""
+    global _cache
+    if not USE_TRAVEL_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            ttl = TRAVEL_CACHE_TTL
+            _cache = TravelTimeCache(TRAVEL_CACHE_PATH, ttl if ttl > 0 else None)
+        return _cache
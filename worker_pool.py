@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import multiprocessing
+import metrics
+
+# Spawned (not forked) so workers never inherit Flask's threads or sockets
+_ctx = multiprocessing.get_context("spawn")
+
+
+class WorkerError(RuntimeError):
+    """Raised when a worker crashes, times out or the job itself fails."""
+
+
+def _worker_main(conn, max_jobs):
+    """
+    Worker loop: import the routing stack once, then serve jobs from the pipe
+    until max_jobs have been handled. The location registry comes from the
+    shared snapshot and is only rebuilt when the workbook changes. Jobs are
+    map requests, or route JSON requests when job['kind'] == 'route'.
+    """
+    from dotenv import load_dotenv
+    from route_backend_backend import handle_map_request, handle_route_request
+    from locations import LOCATIONS_PATH, load_location_registry
+
+    load_dotenv()
+    api_key = os.getenv('API_KEY')
+
+    handled = 0
+    while handled < max_jobs:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        try:
+            handler = handle_route_request if job.get("kind") == "route" else handle_map_request
+            reply = ("ok", handler(job, load_location_registry(LOCATIONS_PATH), api_key))
+        except Exception as e:
+            reply = ("error", str(e))
+        # Stage timings recorded here are merged into the parent's /metrics
+        conn.send(reply + (metrics.drain(),))
+        handled += 1
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, max_jobs):
+        self.conn, child_conn = _ctx.Pipe()
+        self.process = _ctx.Process(target=_worker_main, args=(child_conn, max_jobs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.max_jobs = max_jobs
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.conn.close()
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class MapWorkerPool:
+    """
+    Pool of long-lived processes that each keep pandas, folium and the routing
+    modules imported and the location table loaded between requests.
+
+    Parameters:
+    - size (int): Number of worker processes (default = CPU count).
+    - max_jobs_per_worker (int): Jobs a worker handles before it is recycled.
+    - timeout (float): Seconds to wait for a single job before the worker is killed.
+    """
+
+    def __init__(self, size=None, max_jobs_per_worker=500, timeout=120):
+        self.size = size or os.cpu_count() or 1
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.size):
+            self._idle.put(_Worker(self.max_jobs_per_worker))
+
+    def submit(self, payload):
+        """Runs one request on an idle worker and returns its result (map HTML, or the route dict for kind 'route')."""
+        if self._closed:
+            raise WorkerError("Worker pool is closed")
+        worker = self._idle.get()
+        try:
+            worker.conn.send(payload)
+            if not worker.conn.poll(self.timeout):
+                raise WorkerError(f"Worker timed out after {self.timeout}s")
+            status, result, worker_metrics = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError) as e:
+            metrics.inc("route_subprocess_failures_total", kind="map_worker")
+            self._replace(worker)
+            raise WorkerError(f"Worker crashed: {e!r}")
+        except WorkerError:
+            metrics.inc("route_subprocess_failures_total", kind="map_worker")
+            self._replace(worker)
+            raise
+        metrics.merge(worker_metrics)
+
+        worker.jobs += 1
+        if worker.jobs >= worker.max_jobs:
+            # The worker exits on its own after max_jobs; start a fresh one
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+        if status != "ok":
+            raise WorkerError(result)
+        return result
+
+    def _replace(self, worker):
+        worker.stop()
+        with self._lock:
+            if not self._closed:
+                self._idle.put(_Worker(self.max_jobs_per_worker))
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide pool, creating it on first use from MAP_WORKERS / MAP_WORKER_MAX_JOBS."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = MapWorkerPool(
+                size=int(os.getenv("MAP_WORKERS", "0")) or None,
+                max_jobs_per_worker=int(os.getenv("MAP_WORKER_MAX_JOBS", "500")),
+                timeout=float(os.getenv("MAP_WORKER_TIMEOUT", "120")),
+            )
+        return _pool